@@ -1,5 +1,6 @@
-from django.contrib import admin
-from .models import HeroSection, AboutSection, ContactInfo, FeaturedProduct, Order, OrderItem, OrderItemExtra
+from django.contrib import admin, messages
+from .models import HeroSection, AboutSection, ContactInfo, FeaturedProduct, Order, OrderItem, OrderItemExtra, OrderIntake
+from .transitions import bulk_transition
 
 @admin.register(HeroSection)
 class HeroSectionAdmin(admin.ModelAdmin):
@@ -105,6 +106,21 @@ class FeaturedProductAdmin(admin.ModelAdmin):
     )
 
 # ADMIN PARA PEDIDOS
+def bulk_status_action(new_status, label):
+    """Acción del admin que cambia el estado con el mismo camino que /api/orders/bulk_status/"""
+    def action(modeladmin, request, queryset):
+        results = bulk_transition(new_status, ids=queryset.values_list('id', flat=True))
+        updated = sum(1 for result in results if result['result'] == 'updated')
+        skipped = len(results) - updated
+        modeladmin.message_user(request, f"{updated} pedido(s) marcados como {label}.", messages.SUCCESS)
+        if skipped:
+            modeladmin.message_user(
+                request, f"{skipped} pedido(s) no admiten pasar a {label} desde su estado actual.", messages.WARNING
+            )
+    action.__name__ = f'mark_{new_status}'
+    action.short_description = f"Marcar como {label}"
+    return action
+
 class OrderItemExtraInline(admin.TabularInline):
     model = OrderItemExtra
     extra = 0
@@ -121,8 +137,9 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ['order_number', 'customer_name', 'customer_phone', 'status', 'total_amount', 'created_at']
     list_filter = ['status', 'created_at', 'delivery_city']
     search_fields = ['order_number', 'customer_name', 'customer_email', 'customer_phone']
-    readonly_fields = ['order_number', 'created_at', 'updated_at']
-    list_editable = ['status']
+    readonly_fields = ['order_number', 'status', 'created_at', 'updated_at']
+    # El estado se cambia con acciones para respetar las transiciones permitidas
+    actions = [bulk_status_action(value, label.lower()) for value, label in Order.STATUS_CHOICES if value != 'pending']
     inlines = [OrderItemInline]
     
     fieldsets = (
@@ -162,3 +179,10 @@ class OrderItemExtraAdmin(admin.ModelAdmin):
     list_filter = ['order_item__order__status', 'order_item__order__created_at']
     search_fields = ['ingredient_name', 'order_item__product_name', 'order_item__order__order_number']
     readonly_fields = ['ingredient_name', 'quantity', 'unit_price', 'total_price']
+
+@admin.register(OrderIntake)
+class OrderIntakeAdmin(admin.ModelAdmin):
+    list_display = ['order_number', 'status', 'created_at', 'processed_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['order_number']
+    readonly_fields = ['order_number', 'payload', 'status', 'error', 'order', 'created_at', 'processed_at']
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate, pre_migrate
+        from . import signals  # noqa: F401
+        from .search import drop_search_triggers, install_search_triggers
+
+        # Los triggers del índice de búsqueda se quitan durante cada migrate
+        pre_migrate.connect(drop_search_triggers, sender=self, dispatch_uid='api_search_triggers_drop')
+        post_migrate.connect(install_search_triggers, sender=self, dispatch_uid='api_search_triggers_install')
@@ -0,0 +1,201 @@
+"""Resolución de un carrito: productos, ingredientes y precios en consultas fijas.
+
+El ``CartResolver`` se construye en ``CreateOrderSerializer.validate`` y se
+reutiliza en ``create`` para no volver a leer los mismos productos.
+
+Los precios se calculan con las filas recién leídas, no con la tabla en memoria
+de ``api.pricing``: su versión vive en la caché de cada worker y un cambio de
+precio hecho en otro proceso podría no verse al cobrar.
+"""
+from products.models import Product, ProductIngredient
+from .pricing import ZERO, ProductPrice
+
+
+class CartLine:
+    """Un item del carrito ya validado y con precio calculado (Decimal)"""
+
+    def __init__(self, index, product, quantity, extras, ingredients, price):
+        self.index = index
+        self.product = product
+        self.quantity = quantity
+        self.extras = extras  # [(ProductIngredient, cantidad, precio unitario)]
+        self.ingredients = ingredients  # [(ProductIngredient, incluido)]
+        self.base_price = price.base_price
+        self.extras_total = price.extras_total(
+            {product_ingredient.ingredient_id: extra_quantity for product_ingredient, extra_quantity, _ in extras}
+        )
+        self.unit_price = self.base_price + self.extras_total
+        self.total_price = self.unit_price * quantity
+
+
+class CartResolver:
+    """Valida los items de un pedido cargando productos e ingredientes en dos consultas"""
+
+    def __init__(self, items):
+        self.items = items
+        self.lines = []
+        self.errors = []
+        self.products = {}
+        self.prices = {}  # product_id -> ProductPrice
+        self.product_ingredients = {}  # product_id -> {ingredient_id: ProductIngredient activo}
+
+    @property
+    def total_amount(self):
+        return sum((line.total_price for line in self.lines), ZERO)
+
+    def quote(self):
+        """Resumen de precios por línea y total, junto con los errores de validación"""
+        return {
+            'valid': not self.errors,
+            'errors': self.errors,
+            'lines': [
+                {
+                    'index': line.index,
+                    'product_id': line.product.id,
+                    'product_name': line.product.name,
+                    'quantity': line.quantity,
+                    'base_price': line.base_price,
+                    'extras_total': line.extras_total,
+                    'unit_price': line.unit_price,
+                    'total_price': line.total_price,
+                    'extras': [
+                        {
+                            'ingredient_id': product_ingredient.ingredient_id,
+                            'ingredient_name': product_ingredient.ingredient.name,
+                            'quantity': extra_quantity,
+                            'unit_price': extra_unit_price,
+                            'total_price': extra_unit_price * extra_quantity,
+                        }
+                        for product_ingredient, extra_quantity, extra_unit_price in line.extras
+                    ],
+                }
+                for line in self.lines
+            ],
+            'total': self.total_amount,
+        }
+
+    def resolve(self):
+        parsed = [self._parse_item(i, item) for i, item in enumerate(self.items)]
+        product_ids = {p[1] for p in parsed if p is not None}
+        self._load(product_ids)
+
+        for entry in parsed:
+            if entry is None:
+                continue
+            i, product_id, quantity, item = entry
+            product = self.products.get(product_id)
+            if product is None:
+                self.errors.append(f"Item {i}: Producto con ID {product_id} no existe")
+                continue
+            line = self._resolve_line(i, product, quantity, item)
+            if line is not None:
+                self.lines.append(line)
+        return self
+
+    def _load(self, product_ids):
+        if not product_ids:
+            return
+        self.products = Product.objects.in_bulk(product_ids)
+        self.prices = {
+            product.id: ProductPrice(product.id, product.price, product.is_active)
+            for product in self.products.values()
+        }
+        for product_ingredient in (
+            ProductIngredient.objects.filter(product_id__in=product_ids, is_active=True)
+            .select_related('ingredient').order_by('id')
+        ):
+            self.product_ingredients.setdefault(product_ingredient.product_id, {})[
+                product_ingredient.ingredient_id
+            ] = product_ingredient
+            self.prices[product_ingredient.product_id].extra_costs[
+                product_ingredient.ingredient_id
+            ] = product_ingredient.extra_cost
+
+    def _parse_item(self, i, item):
+        """Validar los campos simples de un item; devuelve None si tiene errores"""
+        if not isinstance(item, dict):
+            self.errors.append(f"Item {i}: debe ser un objeto")
+            return None
+
+        product_id = item.get('product_id')
+        if not product_id:
+            self.errors.append(f"Item {i}: product_id es requerido")
+            return None
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            self.errors.append(f"Item {i}: product_id debe ser un número válido")
+            return None
+
+        quantity = item.get('quantity')
+        if not quantity:
+            self.errors.append(f"Item {i}: quantity es requerido")
+            return None
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            self.errors.append(f"Item {i}: quantity debe ser un número válido")
+            return None
+        if quantity <= 0:
+            self.errors.append(f"Item {i}: quantity debe ser mayor a 0")
+            return None
+
+        return i, product_id, quantity, item
+
+    def _resolve_line(self, i, product, quantity, item):
+        available = self.product_ingredients.get(product.id, {})
+        price = self.prices[product.id]
+        errors = []
+
+        extras = []
+        extras_data = item.get('extras') or {}
+        if not isinstance(extras_data, dict):
+            errors.append(f"Item {i}: extras debe ser un objeto {{ingredient_id: cantidad}}")
+            extras_data = {}
+        for ingredient_id, extra_quantity in extras_data.items():
+            try:
+                ingredient_id = int(ingredient_id)
+                extra_quantity = int(extra_quantity)
+            except (TypeError, ValueError):
+                errors.append(f"Item {i}: extra {ingredient_id} debe tener IDs y cantidades numéricas")
+                continue
+            if extra_quantity < 0:
+                errors.append(f"Item {i}: la cantidad del extra {ingredient_id} no puede ser negativa")
+                continue
+            if extra_quantity == 0:
+                continue
+            product_ingredient = available.get(ingredient_id)
+            if product_ingredient is None or ingredient_id not in price.extra_costs:
+                errors.append(f"Item {i}: el ingrediente {ingredient_id} no está disponible para {product.name}")
+                continue
+            extras.append((product_ingredient, extra_quantity, price.extra_costs[ingredient_id]))
+
+        included_data = item.get('included_ingredients') or []
+        if not isinstance(included_data, list):
+            errors.append(f"Item {i}: included_ingredients debe ser una lista de IDs")
+            included_data = []
+        included_ingredients = set()
+        for ingredient_id in included_data:
+            try:
+                ingredient_id = int(ingredient_id)
+            except (TypeError, ValueError):
+                errors.append(f"Item {i}: included_ingredients contiene un ID inválido ({ingredient_id})")
+                continue
+            if ingredient_id not in available:
+                errors.append(f"Item {i}: el ingrediente {ingredient_id} no pertenece a {product.name}")
+                continue
+            included_ingredients.add(ingredient_id)
+
+        if errors:
+            self.errors.extend(errors)
+            return None
+
+        # Si el cliente envía ingredientes incluidos se usa esa lista; si no, los valores por defecto
+        ingredients = [
+            (
+                product_ingredient,
+                ingredient_id in included_ingredients if included_data else product_ingredient.default_included,
+            )
+            for ingredient_id, product_ingredient in available.items()
+        ]
+        return CartLine(i, product, quantity, extras, ingredients, price)
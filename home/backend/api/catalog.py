@@ -0,0 +1,99 @@
+"""Sincronización de tags e ingredientes de un producto por diferencias.
+
+En lugar de borrar y recrear todas las filas, se compara lo guardado con lo
+recibido y se aplica solo la diferencia con ``bulk_create``/``bulk_update`` y
+un ``delete`` por lote. Las filas que no cambian conservan su id.
+
+``bulk_create``/``bulk_update`` no envían señales; el menú y la tabla de
+precios se invalidan igual porque el producto se guarda en la misma
+transacción (``api.signals`` vuelve a invalidar al hacer commit).
+"""
+import json
+
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from products.models import Ingredient, ProductIngredient, ProductTag
+
+INGREDIENT_FIELDS = ['default_included', 'extra_cost', 'is_active']
+
+
+class ProductIngredientInputSerializer(serializers.Serializer):
+    # Formato que envía ProductManagement.tsx
+    ingredient_id = serializers.IntegerField()
+    default_included = serializers.BooleanField(default=True)
+    extra_cost = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, default=0)
+    is_active = serializers.BooleanField(default=True)
+
+
+def extract_tag_names(data):
+    """Tags de ``tag_names[0]``, ``tag_names[1]``... (multipart) o ``tag_names`` (JSON); None si no vienen"""
+    if isinstance(data.get('tag_names'), list):
+        return data['tag_names']
+    keys = [key for key in data.keys() if key.startswith('tag_names[') and key.endswith(']')]
+    if not keys:
+        return None
+    return [data[key] for key in keys]
+
+
+def parse_product_ingredients(raw):
+    """Validar la lista de ingredientes (JSON en texto o lista); lanza ValidationError"""
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw) if raw.strip() else []
+        except ValueError:
+            raise ValidationError({'product_ingredients': 'JSON inválido'})
+    serializer = ProductIngredientInputSerializer(data=raw, many=True)
+    if not serializer.is_valid():
+        raise ValidationError({'product_ingredients': serializer.errors})
+    entries = serializer.validated_data
+
+    ids = [entry['ingredient_id'] for entry in entries]
+    if len(set(ids)) != len(ids):
+        raise ValidationError({'product_ingredients': 'Ingrediente repetido'})
+    missing = set(ids) - set(Ingredient.objects.filter(pk__in=ids).values_list('id', flat=True))
+    if missing:
+        raise ValidationError({'product_ingredients': f"Ingredientes no encontrados: {sorted(missing)}"})
+    return entries
+
+
+def sync_product_tags(product, names):
+    """Dejar el producto exactamente con ``names`` (sin vacíos ni repetidos)"""
+    wanted = list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+    keep, stale = {}, []
+    for tag in ProductTag.objects.filter(product=product).order_by('id'):
+        if tag.name in wanted and tag.name not in keep:
+            keep[tag.name] = tag
+        else:
+            stale.append(tag.pk)
+    if stale:
+        ProductTag.objects.filter(pk__in=stale).delete()
+    ProductTag.objects.bulk_create([
+        ProductTag(product=product, name=name) for name in wanted if name not in keep
+    ])
+
+
+def sync_product_ingredients(product, entries):
+    """Crear, actualizar o eliminar solo los ingredientes que cambiaron"""
+    existing = {pi.ingredient_id: pi for pi in ProductIngredient.objects.filter(product=product)}
+    wanted = {entry['ingredient_id']: entry for entry in entries}
+
+    to_create, to_update = [], []
+    for ingredient_id, entry in wanted.items():
+        current = existing.get(ingredient_id)
+        if current is None:
+            to_create.append(ProductIngredient(
+                product=product, ingredient_id=ingredient_id,
+                **{field: entry[field] for field in INGREDIENT_FIELDS}
+            ))
+        elif any(getattr(current, field) != entry[field] for field in INGREDIENT_FIELDS):
+            for field in INGREDIENT_FIELDS:
+                setattr(current, field, entry[field])
+            to_update.append(current)
+
+    stale = [pi.pk for ingredient_id, pi in existing.items() if ingredient_id not in wanted]
+    if stale:
+        ProductIngredient.objects.filter(pk__in=stale).delete()
+    if to_update:
+        ProductIngredient.objects.bulk_update(to_update, INGREDIENT_FIELDS)
+    ProductIngredient.objects.bulk_create(to_create)
@@ -0,0 +1,341 @@
+"""Importación y exportación del catálogo (categorías, ingredientes, productos,
+tags e ingredientes por producto) en CSV o JSON.
+
+Claves naturales: categoría e ingrediente por nombre, producto por (categoría,
+nombre). La importación lee lo existente con pocas consultas, inserta lo nuevo
+con ``bulk_create`` y actualiza solo lo que cambió con ``bulk_update``. Los tags
+y los ingredientes de cada producto importado quedan exactamente como en el
+archivo.
+
+JSON::
+
+    {"categories": [{"name": "Pizzas", "icon": "🍕"}],
+     "ingredients": [{"name": "Queso", "is_active": true}],
+     "products": [{"category": "Pizzas", "name": "Margherita", "description": "...",
+                   "price": "18.99", "is_active": true, "tags": ["Popular"],
+                   "ingredients": [{"name": "Queso", "default_included": true,
+                                    "extra_cost": "1.50", "is_active": true}]}]}
+
+CSV: una fila por ingrediente de cada producto (o una fila sin ingrediente),
+con las columnas de ``CSV_COLUMNS``; ``tags`` separados por ``|``.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from products.models import Category, Ingredient, Product, ProductIngredient, ProductTag
+from .menu import invalidate_menu
+from .pricing import invalidate_prices
+from .signals import invalidate
+
+BATCH_SIZE = 1000
+
+CSV_COLUMNS = [
+    'category', 'category_icon', 'product', 'description', 'price', 'product_active', 'tags',
+    'ingredient', 'default_included', 'extra_cost', 'ingredient_active',
+]
+
+PRODUCT_FIELDS = ['description', 'price', 'is_active']
+LINK_FIELDS = ['default_included', 'extra_cost', 'is_active']
+
+
+class CatalogError(ValueError):
+    pass
+
+
+def parse_bool(value, default=True):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 'si', 'sí', 'yes'):
+        return True
+    if text in ('0', 'false', 'no'):
+        return False
+    raise CatalogError(f"Valor booleano inválido: {value!r}")
+
+
+def parse_decimal(value, default=None):
+    if value is None or value == '':
+        if default is None:
+            raise CatalogError("Falta un precio")
+        return default
+    try:
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise CatalogError(f"Número inválido: {value!r}")
+
+
+def normalize_product(entry):
+    """Producto con valores validados; lanza CatalogError"""
+    if not entry.get('category') or not entry.get('name'):
+        raise CatalogError("Cada producto necesita 'category' y 'name'")
+    return {
+        'category': entry['category'].strip(),
+        'name': entry['name'].strip(),
+        'description': entry.get('description') or '',
+        'price': parse_decimal(entry.get('price')),
+        'is_active': parse_bool(entry.get('is_active')),
+        'tags': list(dict.fromkeys(t.strip() for t in entry.get('tags') or [] if t and t.strip())),
+        'ingredients': [
+            {
+                'name': link['name'].strip(),
+                'default_included': parse_bool(link.get('default_included')),
+                'extra_cost': parse_decimal(link.get('extra_cost'), Decimal('0.00')),
+                'is_active': parse_bool(link.get('is_active')),
+            }
+            for link in entry.get('ingredients') or []
+        ],
+    }
+
+
+def read_json(stream):
+    data = json.load(stream)
+    return {
+        'categories': {c['name'].strip(): c.get('icon', '') for c in data.get('categories', [])},
+        # is_active None: no cambiar el estado de un ingrediente existente
+        'ingredients': {i['name'].strip(): i.get('is_active') for i in data.get('ingredients', [])},
+        'products': [normalize_product(p) for p in data.get('products', [])],
+    }
+
+
+def read_csv(stream):
+    categories, ingredients, products = {}, {}, {}
+    for line, row in enumerate(csv.DictReader(stream), start=2):
+        try:
+            key = (row['category'].strip(), row['product'].strip())
+            categories.setdefault(key[0], row.get('category_icon') or '')
+            if key not in products:
+                products[key] = {
+                    'category': key[0], 'name': key[1], 'description': row.get('description'),
+                    'price': row.get('price'), 'is_active': row.get('product_active'),
+                    'tags': (row.get('tags') or '').split('|'), 'ingredients': [],
+                }
+            if row.get('ingredient'):
+                name = row['ingredient'].strip()
+                ingredients.setdefault(name, None)
+                products[key]['ingredients'].append({
+                    'name': name, 'default_included': row.get('default_included'),
+                    'extra_cost': row.get('extra_cost'), 'is_active': row.get('ingredient_active'),
+                })
+        except (KeyError, AttributeError):
+            raise CatalogError(f"Línea {line}: faltan columnas (se esperan {', '.join(CSV_COLUMNS)})")
+    try:
+        normalized = [normalize_product(p) for p in products.values()]
+    except CatalogError as exc:
+        raise CatalogError(f"CSV: {exc}")
+    return {'categories': categories, 'ingredients': ingredients, 'products': normalized}
+
+
+def _by_names(model, names):
+    """Filas con esos nombres, ordenadas por id; una consulta por lote
+    (SQLite limita la cantidad de parámetros por consulta)"""
+    rows = []
+    for start in range(0, len(names), BATCH_SIZE):
+        rows.extend(model.objects.filter(name__in=names[start:start + BATCH_SIZE]))
+    return sorted(rows, key=lambda obj: obj.pk)
+
+
+def _upsert_by_name(model, wanted, field):
+    """Crear los nombres que faltan y actualizar ``field`` si cambió; devuelve {nombre: id}"""
+    existing = {}
+    for obj in _by_names(model, list(wanted)):
+        existing.setdefault(obj.name, obj)
+    changed = []
+    for name, value in wanted.items():
+        obj = existing.get(name)
+        if obj is not None and value is not None and getattr(obj, field) != value:
+            setattr(obj, field, value)
+            changed.append(obj)
+    model.objects.bulk_update(changed, [field], batch_size=BATCH_SIZE)
+    missing = [
+        model(name=name, **({field: value} if value is not None else {}))
+        for name, value in wanted.items() if name not in existing
+    ]
+    model.objects.bulk_create(missing, batch_size=BATCH_SIZE)
+    ids = {name: obj.pk for name, obj in existing.items()}
+    if missing:
+        for obj in _by_names(model, [obj.name for obj in missing]):
+            ids.setdefault(obj.name, obj.pk)
+    return ids
+
+
+def _delete_ids(model, ids):
+    for start in range(0, len(ids), BATCH_SIZE):
+        model.objects.filter(pk__in=ids[start:start + BATCH_SIZE]).delete()
+
+
+def refresh_category_counts(category_ids):
+    """Recalcular active_products_count (bulk_create/bulk_update no pasan por Product.save)"""
+    active = (
+        Product.objects.filter(category=OuterRef('pk'), is_active=True)
+        .order_by().values('category').annotate(total=Count('id')).values('total')
+    )
+    Category.objects.filter(pk__in=category_ids).update(active_products_count=Coalesce(Subquery(active), 0))
+
+
+@transaction.atomic
+def import_catalog(data):
+    """Aplicar un catálogo normalizado en una transacción; devuelve contadores"""
+    categories = dict(data['categories'])
+    for product in data['products']:
+        categories.setdefault(product['category'], None)
+    ingredients = dict(data['ingredients'])
+    for product in data['products']:
+        for link in product['ingredients']:
+            ingredients.setdefault(link['name'], None)
+
+    category_ids = _upsert_by_name(Category, categories, 'icon')
+    ingredient_ids = _upsert_by_name(Ingredient, ingredients, 'is_active')
+
+    # Productos: clave (categoría, nombre); el último del archivo gana si se repite
+    wanted = {(category_ids[p['category']], p['name']): p for p in data['products']}
+    existing = {}
+    for product in Product.objects.filter(category_id__in=set(category_ids.values())).order_by('id'):
+        existing.setdefault((product.category_id, product.name), product)
+
+    changed, missing, now = [], [], timezone.now()
+    for (category_id, name), entry in wanted.items():
+        product = existing.get((category_id, name))
+        if product is None:
+            missing.append(Product(category_id=category_id, name=name, **{f: entry[f] for f in PRODUCT_FIELDS}))
+        elif any(getattr(product, f) != entry[f] for f in PRODUCT_FIELDS):
+            for f in PRODUCT_FIELDS:
+                setattr(product, f, entry[f])
+            product.updated_at = now  # bulk_update no aplica auto_now
+            changed.append(product)
+    Product.objects.bulk_update(changed, PRODUCT_FIELDS + ['updated_at'], batch_size=BATCH_SIZE)
+    Product.objects.bulk_create(missing, batch_size=BATCH_SIZE)
+    if missing:
+        existing = {}
+        for product in Product.objects.filter(category_id__in=set(category_ids.values())).order_by('id'):
+            existing.setdefault((product.category_id, product.name), product)
+    product_ids = {key: existing[key].pk for key in wanted}
+    imported = set(product_ids.values())
+    scope = Product.objects.filter(category_id__in=set(category_ids.values()))
+
+    # Tags: dejar exactamente los del archivo
+    wanted_tags = dict.fromkeys((product_ids[key], tag) for key, entry in wanted.items() for tag in entry['tags'])
+    kept, stale_tags = set(), []
+    for pk, product_id, name in ProductTag.objects.filter(product__in=scope).values_list('id', 'product_id', 'name'):
+        if product_id not in imported:
+            continue
+        if (product_id, name) in wanted_tags and (product_id, name) not in kept:
+            kept.add((product_id, name))
+        else:
+            stale_tags.append(pk)
+    _delete_ids(ProductTag, stale_tags)
+    ProductTag.objects.bulk_create(
+        [ProductTag(product_id=product_id, name=name) for product_id, name in wanted_tags if (product_id, name) not in kept],
+        batch_size=BATCH_SIZE
+    )
+
+    # Ingredientes por producto: clave (producto, ingrediente)
+    wanted_links = {
+        (product_ids[key], ingredient_ids[link['name']]): link
+        for key, entry in wanted.items() for link in entry['ingredients']
+    }
+    changed_links, stale_links, present = [], [], set()
+    for link in ProductIngredient.objects.filter(product__in=scope):
+        if link.product_id not in imported:
+            continue
+        entry = wanted_links.get((link.product_id, link.ingredient_id))
+        if entry is None:
+            stale_links.append(link.pk)
+            continue
+        present.add((link.product_id, link.ingredient_id))
+        if any(getattr(link, f) != entry[f] for f in LINK_FIELDS):
+            for f in LINK_FIELDS:
+                setattr(link, f, entry[f])
+            changed_links.append(link)
+    _delete_ids(ProductIngredient, stale_links)
+    ProductIngredient.objects.bulk_update(changed_links, LINK_FIELDS, batch_size=BATCH_SIZE)
+    ProductIngredient.objects.bulk_create([
+        ProductIngredient(product_id=product_id, ingredient_id=ingredient_id, **{f: entry[f] for f in LINK_FIELDS})
+        for (product_id, ingredient_id), entry in wanted_links.items()
+        if (product_id, ingredient_id) not in present
+    ], batch_size=BATCH_SIZE)
+
+    refresh_category_counts(set(category_ids.values()))
+    # Las operaciones en lote no envían señales: invalidar una sola vez
+    invalidate(invalidate_menu)
+    invalidate(invalidate_prices)
+    return {
+        'categories': len(category_ids),
+        'ingredients': len(ingredient_ids),
+        'products_created': len(missing),
+        'products_updated': len(changed),
+        'tags_created': len(wanted_tags) - len(kept),
+        'tags_deleted': len(stale_tags),
+        'links_created': len(wanted_links) - len(present),
+        'links_updated': len(changed_links),
+        'links_deleted': len(stale_links),
+    }
+
+
+def catalog_products():
+    return (
+        Product.objects.select_related('category')
+        .prefetch_related(Prefetch('tags', ProductTag.objects.order_by('id')), Prefetch(
+            'product_ingredients', ProductIngredient.objects.select_related('ingredient').order_by('id')
+        ))
+        .order_by('category_id', 'id')
+    )
+
+
+def product_entry(product):
+    return {
+        'category': product.category.name,
+        'name': product.name,
+        'description': product.description,
+        'price': str(product.price),
+        'is_active': product.is_active,
+        'tags': [tag.name for tag in product.tags.all()],
+        'ingredients': [
+            {
+                'name': link.ingredient.name,
+                'default_included': link.default_included,
+                'extra_cost': str(link.extra_cost),
+                'is_active': link.is_active,
+            }
+            for link in product.product_ingredients.all()
+        ],
+    }
+
+
+def export_json(stream):
+    data = {
+        'categories': [{'name': c.name, 'icon': c.icon} for c in Category.objects.order_by('id')],
+        'ingredients': [{'name': i.name, 'is_active': i.is_active} for i in Ingredient.objects.order_by('id')],
+        'products': [product_entry(p) for p in catalog_products().iterator(chunk_size=BATCH_SIZE)],
+    }
+    json.dump(data, stream, ensure_ascii=False, indent=2)
+    return len(data['products'])
+
+
+def export_csv(stream):
+    writer = csv.writer(stream)
+    writer.writerow(CSV_COLUMNS)
+    count = 0
+    for product in catalog_products().iterator(chunk_size=BATCH_SIZE):
+        entry = product_entry(product)
+        base = [
+            product.category.name, product.category.icon, entry['name'], entry['description'],
+            entry['price'], int(entry['is_active']), '|'.join(entry['tags']),
+        ]
+        links = entry['ingredients'] or [None]
+        for link in links:
+            if link is None:
+                writer.writerow(base + ['', '', '', ''])
+            else:
+                writer.writerow(base + [
+                    link['name'], int(link['default_included']), link['extra_cost'], int(link['is_active'])
+                ])
+        count += 1
+    return count
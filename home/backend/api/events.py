@@ -0,0 +1,146 @@
+"""Eventos de pedidos en vivo para cocina/admin (Server-Sent Events).
+
+``publish_order_event`` se llama desde las vistas (código síncrono) y entrega el
+evento al broker configurado en ``ORDER_EVENTS_BROKER``. El ``LocalBroker`` lo
+reparte dentro del mismo proceso; con varios workers se reemplaza por un broker
+que publique en un canal compartido (p. ej. Redis pub/sub) y llame a
+``hub.dispatch`` en cada worker al recibir el mensaje.
+
+El id de cada evento lo asigna el broker una sola vez al publicar (un broker
+compartido debe usar un contador común, p. ej. ``INCR`` en Redis), así un
+``Last-Event-ID`` vale en cualquier worker. Cada hub guarda los últimos eventos
+en memoria para que un cliente pueda reanudar desde ese id.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+HISTORY_SIZE = 1000
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class OrderEvent:
+    def __init__(self, event_id, event_type, data):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+
+    def encode(self):
+        """Formato text/event-stream"""
+        payload = json.dumps(self.data, cls=DjangoJSONEncoder, ensure_ascii=False)
+        return f"id: {self.id}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+class Subscription:
+    """Cola de eventos de un cliente conectado; vive en el event loop del stream"""
+
+    def __init__(self, hub, loop):
+        self.hub = hub
+        self.loop = loop
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def offer(self, event):
+        # Se ejecuta en el event loop del suscriptor
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Cliente demasiado lento: se cierra el stream y el cliente debe resincronizar
+            self.overflowed = True
+            self.hub.unsubscribe(self)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class OrderEventHub:
+    def __init__(self, history_size=HISTORY_SIZE):
+        self._lock = threading.Lock()
+        self._last_id = 0
+        # El historial tiene todos los eventos con id mayor que este (None: aún no llega ninguno)
+        self._covered_after = None
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+
+    def dispatch(self, event_id, event_type, data):
+        """Entregar un evento ya numerado por el broker a los suscriptores de este proceso (thread-safe)"""
+        with self._lock:
+            event = OrderEvent(event_id, event_type, data)
+            if self._covered_after is None:
+                self._covered_after = event_id - 1
+            elif len(self._history) == self._history.maxlen:
+                self._covered_after = self._history[0].id
+            self._history.append(event)
+            self._last_id = event_id
+            # Dentro del lock para que cada suscriptor reciba los eventos en orden
+            for subscription in self._subscribers:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+        return event
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def history(self, after=0):
+        """Eventos guardados con id mayor que ``after``"""
+        with self._lock:
+            return [event for event in self._history if event.id > after]
+
+    def subscribe(self, last_event_id=None):
+        """Registrar un suscriptor; devuelve (suscripción, eventos a reenviar, reanudación completa)"""
+        subscription = Subscription(self, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscription)
+            if last_event_id is None:
+                return subscription, [], True
+            missed = [event for event in self._history if event.id > last_event_id]
+            # Si el historial no cubre el hueco (eventos anteriores al inicio de este
+            # worker, ya descartados o un id desconocido) el cliente debe recargar la lista
+            complete = (
+                self._covered_after is not None and self._covered_after <= last_event_id <= self._last_id
+            )
+        return subscription, missed, complete
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+
+class LocalBroker:
+    """Broker de un solo proceso: numera el evento y lo entrega directamente al hub local"""
+
+    def __init__(self, hub):
+        self.hub = hub
+        self._lock = threading.Lock()
+        # Ids crecientes también entre reinicios: un Last-Event-ID anterior queda fuera de rango
+        self._last_id = int(time.time() * 1000)
+
+    def publish(self, event_type, data):
+        # Dentro del lock para que el hub reciba los ids en orden
+        with self._lock:
+            self._last_id += 1
+            self.hub.dispatch(self._last_id, event_type, data)
+
+
+hub = OrderEventHub()
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        broker_class = import_string(getattr(settings, 'ORDER_EVENTS_BROKER', 'api.events.LocalBroker'))
+        _broker = broker_class(hub)
+    return _broker
+
+
+def publish_order_event(event_type, data):
+    """Publicar un evento cuando la transacción actual confirme"""
+    transaction.on_commit(lambda: get_broker().publish(event_type, data))
@@ -0,0 +1,130 @@
+"""Exportación de pedidos en CSV o NDJSON, una línea por item con sus extras.
+
+Los items se leen por lotes de ``EXPORT_CHUNK_SIZE`` ordenados por id (cada
+lote es una consulta nueva ``WHERE id > último``, más una para sus extras), así
+que la memoria no depende del total exportado y no queda un cursor abierto
+durante toda la descarga.
+"""
+import csv
+import io
+import json
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from .models import OrderItem, OrderItemExtra
+
+EXPORT_CHUNK_SIZE = 2000
+
+ITEM_FIELDS = [
+    'id', 'order_id', 'order__order_number', 'order__created_at', 'order__status',
+    'order__customer_name', 'order__customer_email', 'order__customer_phone',
+    'order__delivery_city', 'order__delivery_region', 'order__total_amount',
+    'product_id', 'product_name', 'quantity', 'unit_price', 'total_price',
+]
+
+CSV_COLUMNS = [
+    'order_number', 'created_at', 'status', 'customer_name', 'customer_email', 'customer_phone',
+    'delivery_city', 'delivery_region', 'order_total', 'item_id', 'product_id', 'product_name',
+    'quantity', 'unit_price', 'total_price', 'extras',
+]
+
+
+def item_chunks(orders, chunk_size=None):
+    """Lotes de filas de export (una por item) para los pedidos de ``orders``"""
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    items = OrderItem.objects.filter(order__in=orders).order_by('id').values(*ITEM_FIELDS)
+    last_id = 0
+    while True:
+        chunk = list(items.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return
+        last_id = chunk[-1]['id']
+
+        extras_by_item = {}
+        for extra in OrderItemExtra.objects.filter(order_item_id__in=[item['id'] for item in chunk]).order_by('id').values(
+            'order_item_id', 'ingredient_id', 'ingredient_name', 'quantity', 'unit_price', 'total_price'
+        ):
+            extras_by_item.setdefault(extra.pop('order_item_id'), []).append(extra)
+
+        # Una conversión de zona horaria por pedido, no por item
+        created_at = {}
+        for item in chunk:
+            if item['order_id'] not in created_at:
+                created_at[item['order_id']] = timezone.localtime(item['order__created_at']).isoformat()
+        yield [
+            {
+                'order_number': item['order__order_number'],
+                'created_at': created_at[item['order_id']],
+                'status': item['order__status'],
+                'customer_name': item['order__customer_name'],
+                'customer_email': item['order__customer_email'],
+                'customer_phone': item['order__customer_phone'],
+                'delivery_city': item['order__delivery_city'],
+                'delivery_region': item['order__delivery_region'],
+                'order_total': item['order__total_amount'],
+                'item_id': item['id'],
+                'product_id': item['product_id'],
+                'product_name': item['product_name'],
+                'quantity': item['quantity'],
+                'unit_price': item['unit_price'],
+                'total_price': item['total_price'],
+                'extras': extras_by_item.get(item['id'], []),
+            }
+            for item in chunk
+        ]
+
+
+# Celdas que una planilla interpretaría como fórmula (inyección CSV, ver OWASP)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_cell(value):
+    """Neutralizar un texto que empieza como fórmula anteponiendo un apóstrofo"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def format_csv(rows, header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(CSV_COLUMNS)
+    for row in rows:
+        # Extras en una sola celda: "Queso x2 (1.50); Tocino x1 (2.00)"
+        extras = '; '.join(
+            f"{extra['ingredient_name']} x{extra['quantity']} ({extra['unit_price']})" for extra in row['extras']
+        )
+        writer.writerow([csv_cell(extras if column == 'extras' else row[column]) for column in CSV_COLUMNS])
+    return buffer.getvalue()
+
+
+def format_ndjson(rows, header=False):
+    # Decimales como números, igual que la API (COERCE_DECIMAL_TO_STRING = False)
+    return ''.join(json.dumps(row, default=float, ensure_ascii=False) + '\n' for row in rows)
+
+
+FORMATS = {
+    'csv': (format_csv, 'text/csv; charset=utf-8'),
+    'ndjson': (format_ndjson, 'application/x-ndjson'),
+}
+
+
+def export_lines(orders, export_format):
+    """Iterador síncrono (WSGI): un bloque de texto por lote"""
+    formatter = FORMATS[export_format][0]
+    first = True
+    for chunk in item_chunks(orders):
+        yield formatter(chunk, header=first)
+        first = False
+    if first and export_format == 'csv':
+        yield formatter([], header=True)
+
+
+async def aexport_lines(orders, export_format):
+    """Iterador asíncrono (ASGI): Django consumiría un iterador síncrono completo antes de enviarlo"""
+    lines = export_lines(orders, export_format)
+    next_block = sync_to_async(lambda: next(lines, None), thread_sensitive=True)
+    while (block := await next_block()) is not None:
+        yield block
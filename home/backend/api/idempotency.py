@@ -0,0 +1,116 @@
+"""Soporte del header ``Idempotency-Key`` para POST /api/orders/.
+
+La primera solicitud reserva la clave en la tabla ``IdempotencyKey`` y guarda
+la respuesta renderizada; los reintentos con la misma clave reciben esa misma
+respuesta sin volver a ejecutar el serializer. Si llega un duplicado mientras
+la primera sigue en curso, espera a que termine.
+
+Una reserva sin respuesta más antigua que ``ORDER_IDEMPOTENCY_LEASE`` se da por
+abandonada (p. ej. el worker murió por timeout) y un reintento puede tomarla.
+"""
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+POLL_INTERVAL = 0.05
+
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, 'ORDER_IDEMPOTENCY_TTL', 24 * 60 * 60))
+
+
+def _lease():
+    return timedelta(seconds=getattr(settings, 'ORDER_IDEMPOTENCY_LEASE', 60))
+
+
+def _wait_timeout():
+    return getattr(settings, 'ORDER_IDEMPOTENCY_WAIT', 10)
+
+
+def _request_hash(request):
+    return hashlib.sha256(JSONRenderer().render(request.data)).hexdigest()
+
+
+def _claim(key, request_hash):
+    """Intentar reservar la clave; devuelve (registro, creado)"""
+    now = timezone.now()
+    IdempotencyKey.objects.filter(
+        Q(expires_at__lt=now) | Q(response_status__isnull=True, created_at__lt=now - _lease()), key=key
+    ).delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                key=key, request_hash=request_hash, expires_at=now + _ttl()
+            )
+        return record, True
+    except IntegrityError:
+        return IdempotencyKey.objects.filter(key=key).first(), False
+
+
+def _replay(record):
+    response = HttpResponse(
+        record.response_body, status=record.response_status, content_type='application/json'
+    )
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent_response(request, key, handler):
+    """Ejecutar ``handler`` una sola vez por clave y repetir su respuesta en los reintentos"""
+    if len(key) > 255:
+        return Response({'error': 'Idempotency-Key demasiado larga'}, status=status.HTTP_400_BAD_REQUEST)
+
+    request_hash = _request_hash(request)
+    deadline = time.monotonic() + _wait_timeout()
+    while True:
+        record, created = _claim(key, request_hash)
+        if created:
+            break
+        # Esperar a que la solicitud original termine (o se libere la clave)
+        while record is not None:
+            if record.request_hash != request_hash:
+                return Response(
+                    {'error': 'Idempotency-Key ya fue usada con otro contenido'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if record.response_status is not None:
+                return _replay(record)
+            if record.created_at < timezone.now() - _lease():
+                break  # reserva abandonada: volver a intentar tomarla
+            if time.monotonic() > deadline:
+                return Response(
+                    {'error': 'La solicitud original aún se está procesando'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            time.sleep(POLL_INTERVAL)
+            record = IdempotencyKey.objects.filter(pk=record.pk).first()
+
+    try:
+        response = handler()
+    except Exception:
+        record.delete()
+        raise
+
+    if response.status_code >= 500:
+        # Errores del servidor no se guardan: el cliente puede reintentar
+        record.delete()
+        return response
+
+    # Si la reserva venció y otro reintento la tomó, la fila ya no existe
+    IdempotencyKey.objects.filter(pk=record.pk, response_status__isnull=True).update(
+        response_status=response.status_code,
+        response_body=JSONRenderer().render(response.data).decode(),
+    )
+    IdempotencyKey.objects.filter(expires_at__lt=timezone.now()).delete()
+    return response
@@ -0,0 +1,62 @@
+"""Cola de ingreso de pedidos (ORDER_INTAKE_MODE = 'queue').
+
+``POST /api/orders/`` valida el carrito y solo inserta una fila ``OrderIntake``;
+el comando ``process_order_queue`` crea los pedidos en lotes, una transacción
+por lote, para no competir por el lock de escritura de SQLite en cada checkout.
+"""
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import OrderIntake, generate_order_number
+from .log import log_event
+from .serializers import CreateOrderSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def queue_enabled():
+    return getattr(settings, 'ORDER_INTAKE_MODE', 'sync') == 'queue'
+
+
+def enqueue_order(validated_data):
+    """Guardar un pedido ya validado en la cola y devolver la fila creada"""
+    return OrderIntake.objects.create(
+        order_number=generate_order_number(),
+        payload=validated_data,
+    )
+
+
+def process_batch(batch_size=50):
+    """Crear los pedidos pendientes de un lote; devuelve (procesados, fallidos)"""
+    processed = failed = 0
+    with transaction.atomic():
+        pending = OrderIntake.objects.filter(status='pending').order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        for intake in pending[:batch_size]:
+            serializer = CreateOrderSerializer(data=intake.payload)
+            try:
+                # Un savepoint por pedido: un fallo no revierte el resto del lote
+                with transaction.atomic():
+                    serializer.is_valid(raise_exception=True)
+                    intake.order = serializer.save(order_number=intake.order_number)
+                intake.status = 'processed'
+                processed += 1
+            except serializers.ValidationError as e:
+                # Solo un carrito inválido es un fallo definitivo; un error de base
+                # de datos (p. ej. "database is locked") revierte el lote completo
+                # y sus filas siguen pendientes para el próximo intento
+                intake.status = 'failed'
+                intake.error = str(e.detail)
+                failed += 1
+                log_event(
+                    logger, logging.WARNING, 'order.intake_failed',
+                    order_number=intake.order_number, error=intake.error
+                )
+            intake.processed_at = timezone.now()
+            intake.save(update_fields=['order', 'status', 'error', 'processed_at'])
+    return processed, failed
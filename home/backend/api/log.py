@@ -0,0 +1,80 @@
+"""Logging estructurado de la app ``api``.
+
+- ``request_id``: id de correlación por solicitud (ver ``api.middleware``).
+- ``JsonFormatter``: una línea JSON por evento, con los campos extra del evento.
+- ``DebugSamplingFilter``: deja pasar solo una fracción de los eventos DEBUG.
+- ``NonBlockingHandler``: encola los registros y los escribe desde un hilo
+  aparte, para que la solicitud nunca espere por el stdout/stderr.
+
+Este módulo se carga desde ``LOGGING`` en settings, por lo que no debe
+importar modelos.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+request_id = contextvars.ContextVar('request_id', default=None)
+
+
+def log_event(logger, level, event, **fields):
+    """Registrar un evento con campos estructurados"""
+    logger.log(level, event, extra={'fields': fields})
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Muestrea los eventos DEBUG; los niveles superiores pasan siempre"""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        request = getattr(record, 'request_id', None)
+        if request:
+            entry['request_id'] = request
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class NonBlockingHandler(QueueHandler):
+    """QueueHandler con su propio listener; descarta registros si la cola se llena"""
+
+    def __init__(self, maxsize=10000, stream=None):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+        target = logging.StreamHandler(stream or sys.stderr)
+        self.listener = QueueListener(self.queue, target)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from api.catalog_io import export_csv, export_json
+
+WRITERS = {'csv': export_csv, 'json': export_json}
+
+
+class Command(BaseCommand):
+    help = 'Exporta el catálogo completo en CSV o JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(WRITERS), default='json')
+        parser.add_argument('--output', '-o', help='Archivo de salida; por defecto la salida estándar')
+
+    def handle(self, *args, **options):
+        writer = WRITERS[options['format']]
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as stream:
+                count = writer(stream)
+            self.stdout.write(f"Productos exportados: {count}")
+        else:
+            # OutputWrapper agrega un salto de línea a cada write()
+            self.stdout.ending = ''
+            writer(self.stdout)
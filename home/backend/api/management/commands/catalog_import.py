@@ -0,0 +1,32 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.catalog_io import CatalogError, import_catalog, read_csv, read_json
+
+READERS = {'.csv': read_csv, '.json': read_json}
+
+
+class Command(BaseCommand):
+    help = 'Importa catálogos CSV o JSON (una transacción por archivo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Archivos .csv o .json')
+        parser.add_argument('--format', choices=['csv', 'json'], help='Forzar formato; por defecto según la extensión')
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            extension = f".{options['format']}" if options['format'] else os.path.splitext(path)[1].lower()
+            reader = READERS.get(extension)
+            if reader is None:
+                raise CommandError(f"{path}: formato desconocido, use .csv o .json")
+            try:
+                with open(path, encoding='utf-8-sig', newline='') as stream:
+                    data = reader(stream)
+                stats = import_catalog(data)
+            except OSError as exc:
+                raise CommandError(f"{path}: {exc}")
+            except (CatalogError, ValueError, KeyError, TypeError, AttributeError) as exc:
+                raise CommandError(f"{path}: {exc}")
+            summary = ', '.join(f"{key}={value}" for key, value in stats.items())
+            self.stdout.write(f"{path}: {summary}")
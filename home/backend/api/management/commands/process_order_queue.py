@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from api.intake import process_batch
+
+
+class Command(BaseCommand):
+    help = 'Crea en lotes los pedidos encolados por POST /api/orders/ (ORDER_INTAKE_MODE=queue)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Pedidos por transacción')
+        parser.add_argument('--sleep', type=float, default=0.5, help='Segundos de espera con la cola vacía')
+        parser.add_argument('--once', action='store_true', help='Vaciar la cola y terminar')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                processed, failed = process_batch(options['batch_size'])
+            except DatabaseError as e:
+                # El lote se revirtió y sigue pendiente: reintentar tras una pausa
+                self.stderr.write(f"Lote revertido, se reintentará: {e}")
+                time.sleep(options['sleep'])
+                continue
+            if processed or failed:
+                self.stdout.write(f"Procesados: {processed}, fallidos: {failed}")
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['sleep'])
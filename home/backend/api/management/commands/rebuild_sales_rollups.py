@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las ventas diarias por producto y por extra desde los pedidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='Primer día (YYYY-MM-DD); por defecto desde el inicio')
+        parser.add_argument('--to', dest='end', help='Último día (YYYY-MM-DD); por defecto hasta hoy')
+
+    def parse(self, value, name):
+        if value is None:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"--{name}: formato inválido, use YYYY-MM-DD")
+        return day
+
+    def handle(self, *args, **options):
+        start = self.parse(options['start'], 'from')
+        end = self.parse(options['end'], 'to')
+        if start and end and start > end:
+            raise CommandError("--from debe ser anterior o igual a --to")
+        products, extras = rebuild(start, end)
+        self.stdout.write(f"Filas por producto: {products}, filas por extra: {extras}")
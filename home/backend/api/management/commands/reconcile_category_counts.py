@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from products.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = 'Recalcula Category.active_products_count y corrige las categorías desviadas'
+
+    def handle(self, *args, **options):
+        active = Coalesce(Subquery(
+            Product.objects.filter(category=OuterRef('pk'), is_active=True)
+            .order_by().values('category').annotate(total=Count('id')).values('total')
+        ), 0)
+        with transaction.atomic():
+            drifted = list(
+                Category.objects.annotate(actual=active)
+                .exclude(active_products_count=F('actual'))
+                .values_list('id', 'name', 'active_products_count', 'actual')
+            )
+            if drifted:
+                Category.objects.filter(pk__in=[row[0] for row in drifted]).update(active_products_count=active)
+        for pk, name, stored, actual in drifted:
+            self.stdout.write(f"{name} (#{pk}): {stored} -> {actual}")
+        self.stdout.write(f"Categorías corregidas: {len(drifted)}")
@@ -0,0 +1,65 @@
+"""Snapshot precompilado del menú completo (categorías, productos, tags e ingredientes).
+
+El JSON se construye una sola vez por versión y se sirve como bytes. La versión
+(compartida entre workers, ver ``api.versions``) se incrementa desde
+``api.signals`` cuando cambia cualquier modelo del catálogo.
+"""
+import threading
+
+from rest_framework.renderers import JSONRenderer
+
+from products.models import Category, Product, ProductTag
+from .versions import get_version, bump_version
+
+MENU_VERSION_KEY = 'menu:version'
+
+# (versión, url base) -> bytes del JSON
+_snapshots = {}
+_lock = threading.Lock()
+
+
+def menu_etag(version):
+    return f'"menu-{version}"'
+
+
+def build_menu(request, version):
+    """Construir el diccionario del menú a partir del ORM"""
+    # Importación local: views importa este módulo
+    from .views import with_catalog_relations
+    from .serializers import CategorySerializer, ProductSerializer
+
+    categories = Category.objects.order_by('id')
+    products = with_catalog_relations(Product.objects.filter(is_active=True)).order_by('id')
+    tags = (
+        ProductTag.objects.filter(product__is_active=True)
+        .values_list('name', flat=True).distinct().order_by('name')
+    )
+    context = {'request': request}
+    return {
+        'version': version,
+        'categories': CategorySerializer(categories, many=True, context=context).data,
+        'products': ProductSerializer(products, many=True, context=context).data,
+        'tags': list(tags),
+    }
+
+
+def menu_version():
+    return get_version(MENU_VERSION_KEY)
+
+
+def get_menu_snapshot(request, version):
+    """Devolver los bytes del menú para la versión dada, reconstruyéndolo solo si cambió"""
+    # Las URLs de imágenes son absolutas, por lo que el snapshot depende del host
+    key = (version, request.build_absolute_uri('/'))
+    content = _snapshots.get(key)
+    if content is None:
+        content = JSONRenderer().render(build_menu(request, version))
+        with _lock:
+            for stale in [k for k in _snapshots if k[0] != version]:
+                del _snapshots[stale]
+            _snapshots[key] = content
+    return content
+
+
+def invalidate_menu():
+    bump_version(MENU_VERSION_KEY)
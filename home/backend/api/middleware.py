@@ -0,0 +1,44 @@
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .log import request_id
+
+
+class RequestIdMiddleware:
+    """Asigna un id de correlación a cada solicitud (header X-Request-ID)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Bajo ASGI la cadena es async: sin esto cada solicitud (incluido el stream
+        # de pedidos) pasaría por un hilo
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        value, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id.reset(token)
+        response['X-Request-ID'] = value
+        return response
+
+    async def __acall__(self, request):
+        value, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_id.reset(token)
+        response['X-Request-ID'] = value
+        return response
+
+    def start(self, request):
+        value = (request.headers.get('X-Request-ID') or uuid.uuid4().hex)[:64]
+        return value, request_id.set(value)
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-17 18:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderIntake',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_number', models.CharField(max_length=20, unique=True)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('processed', 'Procesado'), ('failed', 'Fallido')], default='pending', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='intake', to='api.order')),
+            ],
+            options={
+                'verbose_name': 'Pedido en Cola',
+                'verbose_name_plural': 'Pedidos en Cola',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='api_intake_status_id_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.0.2 on 2026-10-17 18:58
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def pack_ingredients(apps, schema_editor):
+    """Mover las filas de OrderItemIngredient a OrderItem.ingredient_selection"""
+    OrderItem = apps.get_model('api', 'OrderItem')
+    OrderItemIngredient = apps.get_model('api', 'OrderItemIngredient')
+
+    def flush(selections):
+        items = OrderItem.objects.in_bulk(list(selections))
+        for item_id, selection in selections.items():
+            items[item_id].ingredient_selection = selection
+        OrderItem.objects.bulk_update(items.values(), ['ingredient_selection'])
+
+    selections = {}
+    rows = (
+        OrderItemIngredient.objects.order_by('order_item_id', 'id')
+        .values_list('order_item_id', 'ingredient_id', 'ingredient_name', 'is_included', 'was_default')
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    for order_item_id, ingredient_id, ingredient_name, is_included, was_default in rows:
+        if order_item_id not in selections and len(selections) >= BATCH_SIZE:
+            flush(selections)
+            selections = {}
+        selections.setdefault(order_item_id, []).append(
+            [ingredient_id, ingredient_name, is_included, was_default]
+        )
+    if selections:
+        flush(selections)
+
+
+def unpack_ingredients(apps, schema_editor):
+    OrderItem = apps.get_model('api', 'OrderItem')
+    OrderItemIngredient = apps.get_model('api', 'OrderItemIngredient')
+
+    rows = []
+    for item_id, selection in OrderItem.objects.values_list(
+        'id', 'ingredient_selection'
+    ).iterator(chunk_size=BATCH_SIZE):
+        for ingredient_id, ingredient_name, is_included, was_default in selection:
+            rows.append(OrderItemIngredient(
+                order_item_id=item_id,
+                ingredient_id=ingredient_id,
+                ingredient_name=ingredient_name,
+                is_included=is_included,
+                was_default=was_default,
+            ))
+        if len(rows) >= BATCH_SIZE:
+            OrderItemIngredient.objects.bulk_create(rows)
+            rows = []
+    OrderItemIngredient.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_orderintake'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='ingredient_selection',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(pack_ingredients, unpack_ingredients),
+        migrations.DeleteModel(
+            name='OrderItemIngredient',
+        ),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations
+
+# Índice FTS5 de los productos activos. rowid = products_product.id
+# Los triggers que lo mantienen no se crean aquí: leen products_category y
+# products_producttag, y el rebuild de tablas de SQLite fallaría en cualquier
+# migración posterior. api.search los quita antes de migrar y los recrea después.
+CREATE_TABLE = """
+CREATE VIRTUAL TABLE api_product_search USING fts5(
+    name, description, category, tags,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+INDEX_PRODUCT = """
+INSERT INTO api_product_search (rowid, name, description, category, tags)
+SELECT p.id, p.name, p.description,
+       (SELECT c.name FROM products_category c WHERE c.id = p.category_id),
+       (SELECT group_concat(t.name, ' ') FROM products_producttag t WHERE t.product_id = p.id)
+FROM products_product p
+"""
+
+DROP = [
+    'DROP TRIGGER IF EXISTS api_product_search_ai',
+    'DROP TRIGGER IF EXISTS api_product_search_au',
+    'DROP TRIGGER IF EXISTS api_product_search_ad',
+    'DROP TRIGGER IF EXISTS api_product_search_category_au',
+    'DROP TRIGGER IF EXISTS api_product_search_tag_ai',
+    'DROP TRIGGER IF EXISTS api_product_search_tag_au',
+    'DROP TRIGGER IF EXISTS api_product_search_tag_ad',
+    'DROP TABLE IF EXISTS api_product_search',
+]
+
+
+def create_search_index(apps, schema_editor):
+    # Solo SQLite con FTS5; en otros motores api.search usa icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if not cursor.fetchone()[0]:
+            return
+    schema_editor.execute(CREATE_TABLE)
+    schema_editor.execute(INDEX_PRODUCT + ' WHERE p.is_active')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_orderitem_ingredient_selection'),
+        ('products', '0002_ingredient_alter_product_image_productingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
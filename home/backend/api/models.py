@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from products.models import Product, Ingredient
 import uuid
 
@@ -92,6 +93,10 @@ class FeaturedProduct(models.Model):
         return 0
 
 # MODELOS PARA PEDIDOS
+def generate_order_number():
+    """Número de pedido único con formato ORD-XXXXXXXX"""
+    return f"ORD-{uuid.uuid4().hex[:8].upper()}"
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pendiente'),
@@ -102,6 +107,16 @@ class Order(models.Model):
         ('cancelled', 'Cancelado'),
     ]
     
+    # Transiciones permitidas; 'delivered' y 'cancelled' son estados finales
+    STATUS_TRANSITIONS = {
+        'pending': ['confirmed', 'preparing', 'cancelled'],
+        'confirmed': ['preparing', 'cancelled'],
+        'preparing': ['ready', 'cancelled'],
+        'ready': ['delivered'],
+        'delivered': [],
+        'cancelled': [],
+    }
+    
     order_number = models.CharField(max_length=20, unique=True, editable=False)
     
     # Información del cliente
@@ -130,13 +145,40 @@ class Order(models.Model):
         verbose_name = "Pedido"
         verbose_name_plural = "Pedidos"
         ordering = ['-created_at']
+        indexes = [
+            # Paginación por cursor (created_at, id) con y sin filtro de estado
+            models.Index(fields=['created_at', 'id'], name='api_order_created_id_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='api_order_status_created_idx'),
+            models.Index(fields=['delivery_city', 'created_at'], name='api_order_city_created_idx'),
+            models.Index(fields=['customer_phone', 'created_at'], name='api_order_phone_created_idx'),
+            # Sincronización incremental (/api/orders/changes/)
+            models.Index(fields=['updated_at', 'id'], name='api_order_updated_id_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.order_number:
             # Generar número de pedido único
-            self.order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+            self.order_number = generate_order_number()
         super().save(*args, **kwargs)
     
+    @classmethod
+    def can_transition(cls, current, new_status):
+        return new_status in cls.STATUS_TRANSITIONS.get(current, [])
+    
+    @classmethod
+    def transition_status(cls, pk, expected, new_status):
+        """Cambiar el estado solo si sigue siendo ``expected``, con un único UPDATE condicional.
+        
+        Devuelve False si la transición no está permitida o si otro usuario ya
+        cambió el pedido.
+        """
+        if not cls.can_transition(expected, new_status):
+            return False
+        updated = cls.objects.filter(pk=pk, status=expected).update(
+            status=new_status, updated_at=timezone.now()
+        )
+        return updated == 1
+    
     def __str__(self):
         return f"Pedido {self.order_number} - {self.customer_name}"
 
@@ -151,12 +193,38 @@ class OrderItem(models.Model):
     product_name = models.CharField(max_length=200)
     product_description = models.TextField(blank=True)
     
+    # Ingredientes incluidos/excluidos, empaquetados en una sola columna:
+    # [[ingredient_id, ingredient_name, is_included, was_default], ...]
+    ingredient_selection = models.JSONField(default=list, blank=True)
+    
     class Meta:
         verbose_name = "Item de Pedido"
         verbose_name_plural = "Items de Pedido"
     
     def __str__(self):
         return f"{self.product_name} x{self.quantity} - {self.order.order_number}"
+    
+    @staticmethod
+    def pack_ingredient(ingredient_id, ingredient_name, is_included, was_default):
+        return [ingredient_id, ingredient_name, is_included, was_default]
+    
+    @staticmethod
+    def unpack_ingredients(selection):
+        """Ingredientes con el formato que devolvía OrderItemIngredient"""
+        return [
+            {
+                # Ya no hay una fila por ingrediente: el id es el del ingrediente
+                'id': ingredient_id,
+                'ingredient': ingredient_id,
+                'ingredient_name': ingredient_name,
+                'is_included': is_included,
+                'was_default': was_default,
+            }
+            for ingredient_id, ingredient_name, is_included, was_default in selection
+        ]
+    
+    def get_ingredients(self):
+        return self.unpack_ingredients(self.ingredient_selection)
 
 class OrderItemExtra(models.Model):
     order_item = models.ForeignKey(OrderItem, on_delete=models.CASCADE, related_name='extras')
@@ -175,20 +243,95 @@ class OrderItemExtra(models.Model):
     def __str__(self):
         return f"{self.ingredient_name} x{self.quantity} - {self.order_item.product_name}"
 
-class OrderItemIngredient(models.Model):
-    order_item = models.ForeignKey(OrderItem, on_delete=models.CASCADE, related_name='ingredients')
-    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
-    is_included = models.BooleanField(default=True)  # True = incluido, False = excluido
-    was_default = models.BooleanField(default=False)  # Si era incluido por defecto
+class OrderIntake(models.Model):
+    """Pedido validado a la espera de que el worker (process_order_queue) lo cree"""
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('processed', 'Procesado'),
+        ('failed', 'Fallido'),
+    ]
     
-    # Información del ingrediente al momento del pedido
-    ingredient_name = models.CharField(max_length=100)
+    # Se entrega al cliente en la respuesta 202 y se usa para crear el Order
+    order_number = models.CharField(max_length=20, unique=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True)
+    order = models.OneToOneField(Order, on_delete=models.SET_NULL, blank=True, null=True, related_name='intake')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        verbose_name = "Pedido en Cola"
+        verbose_name_plural = "Pedidos en Cola"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='api_intake_status_id_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.order_number} ({self.status})"
+
+class DailyProductSales(models.Model):
+    """Ventas de un producto en un día (pedidos no cancelados), mantenidas por api.rollups"""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    quantity = models.IntegerField(default=0)
+    # Total de las líneas del producto, extras incluidos
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Venta Diaria por Producto"
+        verbose_name_plural = "Ventas Diarias por Producto"
+        unique_together = ('day', 'product')
+    
+    def __str__(self):
+        return f"{self.day} - {self.product_id}: {self.quantity}"
+
+class DailyExtraSales(models.Model):
+    """Extras vendidos de un ingrediente en un día (pedidos no cancelados), mantenidos por api.rollups"""
+    day = models.DateField()
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, related_name='daily_extra_sales')
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Venta Diaria de Extra"
+        verbose_name_plural = "Ventas Diarias de Extras"
+        unique_together = ('day', 'ingredient')
+    
+    def __str__(self):
+        return f"{self.day} - {self.ingredient_id}: {self.quantity}"
+
+class IdempotencyKey(models.Model):
+    """Respuesta guardada para un header Idempotency-Key (reintentos de POST /api/orders/)"""
+    key = models.CharField(max_length=255, unique=True)
+    request_hash = models.CharField(max_length=64)
+    
+    # Vacío mientras la primera solicitud se está procesando
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_body = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        verbose_name = "Clave de Idempotencia"
+        verbose_name_plural = "Claves de Idempotencia"
+    
+    def __str__(self):
+        return self.key
+
+class DataVersion(models.Model):
+    """Versión compartida por todos los workers de un dato cacheado en memoria (menú, precios)"""
+    key = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField()
     
     class Meta:
-        verbose_name = "Ingrediente de Item"
-        verbose_name_plural = "Ingredientes de Items"
-        unique_together = ['order_item', 'ingredient']
+        verbose_name = "Versión de Datos"
+        verbose_name_plural = "Versiones de Datos"
     
     def __str__(self):
-        status = "incluido" if self.is_included else "excluido"
-        return f"{self.ingredient_name} ({status}) - {self.order_item.product_name}"
+        return f"{self.key}: {self.value}"
@@ -0,0 +1,153 @@
+import base64
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class OrderCursorPagination(BasePagination):
+    """Paginación por cursor sobre (created_at, id), del más reciente al más antiguo.
+
+    Cada página es una consulta ``WHERE (created_at, id) < cursor ORDER BY
+    created_at DESC, id DESC LIMIT n``, así que cuesta lo mismo sin importar
+    qué tan profunda sea.
+    """
+    cursor_query_param = 'cursor'
+    cursor_field = 'created_at'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 200
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            raise ValidationError({'page_size': 'Debe ser un número'})
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, order):
+        # Acepta instancias o filas de values()
+        if isinstance(order, dict):
+            timestamp, pk = order[self.cursor_field], order['id']
+        else:
+            timestamp, pk = getattr(order, self.cursor_field), order.pk
+        raw = f"{timestamp.isoformat()}|{pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            timestamp, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+            timestamp = parse_datetime(timestamp)
+            pk = int(pk)
+        except (ValueError, UnicodeDecodeError):
+            timestamp = None
+        if timestamp is None:
+            raise ValidationError({self.cursor_query_param: 'Cursor inválido'})
+        return timestamp, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-created_at', '-id')
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+
+        # Un registro extra indica si hay página siguiente
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class OrderChangesPagination(OrderCursorPagination):
+    """Pedidos creados o modificados después de una marca (updated_at, id), del más antiguo al más nuevo.
+
+    La nueva marca nunca pasa de ``now - ORDER_CHANGES_SETTLE_SECONDS`` en ninguna
+    página, y al llegar a ese límite ``has_more`` es falso: un pedido guardado en
+    una transacción que confirma tarde puede tener un ``updated_at`` algo anterior
+    al de filas ya visibles, y así vuelve a entrar en la siguiente consulta. El cliente aplica los cambios por ``id``, de modo que repetir un
+    pedido no tiene efecto.
+    """
+    cursor_query_param = 'since'
+    cursor_field = 'updated_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('updated_at', 'id')
+
+        since = request.query_params.get(self.cursor_query_param)
+        if since:
+            updated_at, pk = self.decode_cursor(since)
+            queryset = queryset.filter(
+                Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk)
+            )
+        else:
+            updated_at, pk = None, 0
+
+        page = list(queryset[:page_size + 1])
+        self.has_more = len(page) > page_size
+        page = page[:page_size]
+
+        settled = (timezone.now() - timedelta(seconds=settings.ORDER_CHANGES_SETTLE_SECONDS), 0)
+        position = min((page[-1]['updated_at'], page[-1]['id']), settled) if page else settled
+        if position == settled:
+            # La página llegó a cambios sin asentar: se entregan, pero el cliente
+            # deja de paginar y la siguiente consulta los repite
+            self.has_more = False
+        if updated_at is not None:
+            # La marca nunca retrocede
+            position = max(position, (updated_at, pk))
+        self.watermark = self.encode_cursor({'updated_at': position[0], 'id': position[1]})
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'watermark': self.watermark,
+            'has_more': self.has_more,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'watermark': {'type': 'string'},
+                'has_more': {'type': 'boolean'},
+                'results': schema,
+            },
+        }
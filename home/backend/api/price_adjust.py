@@ -0,0 +1,80 @@
+"""Ajuste masivo de precios con un único UPDATE.
+
+El nuevo valor se calcula en SQL (``ROUND(precio * factor, 2)`` o
+``precio + monto``, nunca negativo); la vista previa usa la misma expresión
+como anotación, así que muestra exactamente lo que el UPDATE escribiría.
+``QuerySet.update`` no envía señales: el menú y la tabla de precios se
+invalidan una sola vez por ajuste.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Greatest, Round
+from django.utils import timezone
+
+from products.models import Product, ProductIngredient, ProductTag
+from .menu import invalidate_menu
+from .pricing import invalidate_prices
+from .signals import invalidate
+
+PREVIEW_LIMIT = 200
+
+PRICE_FIELD = DecimalField(max_digits=10, decimal_places=2)
+
+
+def adjusted(field, mode, value):
+    """Expresión SQL con el valor ajustado de ``field``"""
+    if mode == 'percent':
+        expression = F(field) * Value(1 + value / 100, output_field=DecimalField())
+    else:
+        expression = F(field) + Value(value, output_field=PRICE_FIELD)
+    return Greatest(
+        Round(expression, 2, output_field=PRICE_FIELD), Value(Decimal('0.00'), output_field=PRICE_FIELD),
+        output_field=PRICE_FIELD
+    )
+
+
+def select_products(category=None, tag=None, ids=None):
+    queryset = Product.objects.all()
+    if category:
+        queryset = queryset.filter(category__name=category)
+    if tag:
+        queryset = queryset.filter(pk__in=ProductTag.objects.filter(name=tag).values('product_id'))
+    if ids:
+        queryset = queryset.filter(pk__in=ids)
+    return queryset
+
+
+def adjust_prices(target, mode, value, dry_run=False, ingredient=None, **filters):
+    """Aplicar (o previsualizar con ``dry_run``) el ajuste; devuelve el resumen"""
+    products = select_products(**filters)
+    if target == 'extras':
+        queryset = ProductIngredient.objects.filter(ingredient_id=ingredient)
+        if any(filters.values()):
+            queryset = queryset.filter(product__in=products)
+        field, fields = 'extra_cost', ['id', 'product_id', 'product__name', 'ingredient__name']
+    else:
+        queryset, field, fields = products, 'price', ['id', 'name']
+    expression = adjusted(field, mode, value)
+
+    if dry_run:
+        rows = queryset.annotate(new_value=expression).order_by('id').values(*fields, field, 'new_value')
+        return {
+            'dry_run': True,
+            'count': queryset.count(),
+            'changes': [
+                {**{key.replace('__', '_'): row[key] for key in fields}, 'old': row[field], 'new': row['new_value']}
+                for row in rows[:PREVIEW_LIMIT]
+            ],
+        }
+
+    changes = {field: expression}
+    if target == 'products':
+        changes['updated_at'] = timezone.now()
+    with transaction.atomic():
+        count = queryset.update(**changes)
+        if count:
+            invalidate(invalidate_menu)
+            invalidate(invalidate_prices)
+    return {'dry_run': False, 'count': count}
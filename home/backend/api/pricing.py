@@ -0,0 +1,81 @@
+"""Motor de precios: tabla en memoria de precios base y costos de extras.
+
+Toda la aritmética usa ``Decimal``. La tabla se carga bajo demanda por producto
+y se descarta completa cuando cambia la versión ``pricing:version``, que
+``api.signals`` incrementa al guardar o eliminar ``Product`` o ``ProductIngredient``.
+
+La tabla responde ``calculate_price``. La versión es compartida por todos los
+workers (``api.versions``) y se incrementa en la misma transacción que el cambio,
+así que la cotización coincide con lo que cobra un pedido, que arma sus
+``ProductPrice`` desde las filas que lee ``api.cart.CartResolver``.
+"""
+import threading
+from decimal import Decimal
+
+from products.models import Product, ProductIngredient
+from .versions import get_version, bump_version
+
+PRICING_VERSION_KEY = 'pricing:version'
+
+ZERO = Decimal('0')
+
+_prices = {}  # product_id -> ProductPrice
+_loaded_version = None
+_lock = threading.Lock()
+
+
+class ProductPrice:
+    """Precio base y costos de extras (ingredientes activos) de un producto"""
+
+    def __init__(self, product_id, base_price, is_active):
+        self.product_id = product_id
+        self.base_price = base_price
+        self.is_active = is_active
+        self.extra_costs = {}  # ingredient_id -> Decimal
+
+    def extras_total(self, extras):
+        """Total de extras para {ingredient_id: cantidad}; los IDs deben existir en extra_costs"""
+        return sum(
+            (self.extra_costs[ingredient_id] * quantity for ingredient_id, quantity in extras.items()),
+            ZERO,
+        )
+
+    def unit_price(self, extras):
+        return self.base_price + self.extras_total(extras)
+
+
+def _load(product_ids):
+    prices = {
+        product_id: ProductPrice(product_id, price, is_active)
+        for product_id, price, is_active in Product.objects.filter(id__in=product_ids)
+        .values_list('id', 'price', 'is_active')
+    }
+    if prices:
+        for product_id, ingredient_id, extra_cost in ProductIngredient.objects.filter(
+            product_id__in=prices, is_active=True
+        ).values_list('product_id', 'ingredient_id', 'extra_cost'):
+            prices[product_id].extra_costs[ingredient_id] = extra_cost
+    return prices
+
+
+def get_prices(product_ids):
+    """Devolver {product_id: ProductPrice}; los productos inexistentes no aparecen"""
+    global _loaded_version
+    version = get_version(PRICING_VERSION_KEY)
+    with _lock:
+        if version != _loaded_version:
+            _prices.clear()
+            _loaded_version = version
+        found = {pid: _prices[pid] for pid in product_ids if pid in _prices}
+    missing = [pid for pid in product_ids if pid not in found]
+    if missing:
+        loaded = _load(missing)
+        with _lock:
+            if _loaded_version == version:
+                _prices.update(loaded)
+        found.update(loaded)
+    return found
+
+
+def invalidate_prices():
+    bump_version(PRICING_VERSION_KEY)
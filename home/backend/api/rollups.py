@@ -0,0 +1,184 @@
+"""Tablas de ventas diarias por producto y por extra.
+
+Se actualizan de forma incremental: al crear un pedido se suman sus líneas (ya
+en memoria en ``CreateOrderSerializer``) y al cancelarlo se restan. Los
+reportes leen una fila por día en vez de recorrer ``OrderItem`` y
+``OrderItemExtra``. ``python manage.py rebuild_sales_rollups`` las recalcula
+desde los pedidos para cualquier rango de fechas.
+
+El día es la fecha local (``TIME_ZONE``) de ``Order.created_at``. Los pedidos
+cancelados no se cuentan.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, IntegerField, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyExtraSales, DailyProductSales, Order, OrderItem, OrderItemExtra
+
+ZERO = Decimal('0.00')
+
+
+class SalesDelta:
+    """Cantidades a sumar (o restar) por (día, producto) y (día, ingrediente)"""
+
+    def __init__(self):
+        self.products = defaultdict(lambda: [0, ZERO, 0])
+        self.extras = defaultdict(lambda: [0, ZERO, 0])
+
+    def add(self, table, key, quantity, revenue, orders):
+        totals = table[key]
+        totals[0] += quantity
+        totals[1] += revenue
+        totals[2] += orders
+
+
+def cart_delta(order, cart):
+    """Ventas de un pedido recién creado, a partir de las líneas del carrito"""
+    day = timezone.localdate(order.created_at)
+    delta = SalesDelta()
+    products, extras = set(), set()
+    for line in cart.lines:
+        # Un producto repetido en varias líneas cuenta como un solo pedido
+        first = line.product.id not in products
+        products.add(line.product.id)
+        delta.add(delta.products, (day, line.product.id), line.quantity, line.total_price, int(first))
+        for product_ingredient, extra_quantity, extra_unit_price in line.extras:
+            ingredient_id = product_ingredient.ingredient_id
+            first = ingredient_id not in extras
+            extras.add(ingredient_id)
+            delta.add(
+                delta.extras, (day, ingredient_id),
+                extra_quantity * line.quantity, extra_unit_price * extra_quantity * line.quantity, int(first)
+            )
+    return delta
+
+
+def orders_delta(orders):
+    """Ventas de un queryset de pedidos, con dos consultas agrupadas"""
+    delta = SalesDelta()
+    items = (
+        OrderItem.objects.filter(order__in=orders)
+        .annotate(day=TruncDate('order__created_at'))
+        .values('day', 'product_id')
+        .annotate(
+            total_quantity=Sum('quantity'),
+            revenue=Sum('total_price'),
+            order_count=Count('order_id', distinct=True),
+        )
+        .order_by()
+    )
+    for row in items:
+        delta.add(delta.products, (row['day'], row['product_id']), row['total_quantity'], row['revenue'], row['order_count'])
+
+    # Los extras se guardan por unidad del producto
+    extras = (
+        OrderItemExtra.objects.filter(order_item__order__in=orders)
+        .annotate(day=TruncDate('order_item__order__created_at'))
+        .values('day', 'ingredient_id')
+        .annotate(
+            total_quantity=Sum(F('quantity') * F('order_item__quantity'), output_field=IntegerField()),
+            revenue=Sum(
+                F('total_price') * F('order_item__quantity'),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+            order_count=Count('order_item__order_id', distinct=True),
+        )
+        .order_by()
+    )
+    for row in extras:
+        delta.add(delta.extras, (row['day'], row['ingredient_id']), row['total_quantity'], row['revenue'], row['order_count'])
+    return delta
+
+
+def _upsert(model, key_field, rows):
+    # Un solo INSERT ... ON CONFLICT DO UPDATE que suma sobre la fila existente
+    # (SQLite >= 3.24 y PostgreSQL)
+    table = model._meta.db_table
+    key_column = model._meta.get_field(key_field).column
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))
+    sql = (
+        f'INSERT INTO {table} (day, {key_column}, quantity, revenue, orders) VALUES {placeholders} '
+        f'ON CONFLICT (day, {key_column}) DO UPDATE SET '
+        f'quantity = {table}.quantity + excluded.quantity, '
+        f'revenue = {table}.revenue + excluded.revenue, '
+        f'orders = {table}.orders + excluded.orders'
+    )
+    params = []
+    for row in rows:
+        params.extend(row)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _apply(model, key_field, table, sign):
+    if not table:
+        return
+    rows = [
+        (day, key, sign * quantity, sign * revenue, sign * orders)
+        for (day, key), (quantity, revenue, orders) in table.items()
+    ]
+    if connection.vendor in ('sqlite', 'postgresql'):
+        _upsert(model, key_field, rows)
+        return
+    # Otras bases: crear las filas que falten y sumar con F() fila por fila
+    model.objects.bulk_create(
+        [model(day=day, **{key_field: key}) for day, key, *_ in rows],
+        ignore_conflicts=True
+    )
+    for day, key, quantity, revenue, orders in rows:
+        model.objects.filter(day=day, **{key_field: key}).update(
+            quantity=F('quantity') + quantity,
+            revenue=F('revenue') + revenue,
+            orders=F('orders') + orders,
+        )
+
+
+@transaction.atomic
+def apply_delta(delta, sign=1):
+    """Sumar (``sign=1``) o restar (``sign=-1``) un delta de las tablas diarias"""
+    _apply(DailyProductSales, 'product_id', delta.products, sign)
+    _apply(DailyExtraSales, 'ingredient_id', delta.extras, sign)
+
+
+def record_order(order, cart):
+    apply_delta(cart_delta(order, cart))
+
+
+def remove_orders(orders):
+    """Restar pedidos que pasan a cancelados (queryset o lista de ids)"""
+    apply_delta(orders_delta(orders), sign=-1)
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+@transaction.atomic
+def rebuild(start=None, end=None):
+    """Recalcular las tablas desde los pedidos para los días entre ``start`` y ``end`` (incluidos)"""
+    days = {}
+    orders = Order.objects.exclude(status='cancelled')
+    if start:
+        days['day__gte'] = start
+        orders = orders.filter(created_at__gte=_start_of(start))
+    if end:
+        days['day__lte'] = end
+        orders = orders.filter(created_at__lt=_start_of(end + timedelta(days=1)))
+    DailyProductSales.objects.filter(**days).delete()
+    DailyExtraSales.objects.filter(**days).delete()
+
+    delta = orders_delta(orders)
+    DailyProductSales.objects.bulk_create([
+        DailyProductSales(day=day, product_id=key, quantity=quantity, revenue=revenue, orders=count)
+        for (day, key), (quantity, revenue, count) in delta.products.items()
+    ], batch_size=1000)
+    DailyExtraSales.objects.bulk_create([
+        DailyExtraSales(day=day, ingredient_id=key, quantity=quantity, revenue=revenue, orders=count)
+        for (day, key), (quantity, revenue, count) in delta.extras.items()
+    ], batch_size=1000)
+    return len(delta.products), len(delta.extras)
@@ -0,0 +1,166 @@
+"""Búsqueda de productos con el índice FTS5 ``api_product_search``.
+
+El índice (nombre, descripción, categoría y tags de cada producto, tabla creada
+en la migración 0008) se mantiene con triggers de SQLite, así que también
+refleja ``bulk_create``/``update``. Los acentos se ignoran (``remove_diacritics``) y
+cada palabra buscada se trata como prefijo. Si la base de datos no es SQLite
+o no tiene FTS5 se usa la búsqueda ``icontains`` anterior.
+"""
+import re
+
+from django.db import OperationalError, connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'api_product_search'
+
+# Peso de cada columna en bm25: name, description, category, tags
+RANK_WEIGHTS = (10.0, 2.0, 5.0, 3.0)
+
+INDEX_PRODUCT = f"""
+INSERT INTO {SEARCH_TABLE} (rowid, name, description, category, tags)
+SELECT p.id, p.name, p.description,
+       (SELECT c.name FROM products_category c WHERE c.id = p.category_id),
+       (SELECT group_concat(t.name, ' ') FROM products_producttag t WHERE t.product_id = p.id)
+FROM products_product p
+"""
+
+# Los triggers leen products_category y products_producttag. SQLite no permite
+# recrear esas tablas (AlterField hace CREATE new__..., DROP y RENAME) mientras un
+# trigger las nombra, y el rebuild de products_product borraría los suyos. Por
+# eso no los crea ninguna migración: ``drop_search_triggers`` corre antes de
+# cada ``migrate`` y ``install_search_triggers`` después (ver ApiConfig.ready).
+TRIGGERS = {
+    'api_product_search_ai': f"""
+    CREATE TRIGGER api_product_search_ai AFTER INSERT ON products_product BEGIN
+        {INDEX_PRODUCT} WHERE p.is_active AND p.id = NEW.id;
+    END
+    """,
+    'api_product_search_au': f"""
+    CREATE TRIGGER api_product_search_au AFTER UPDATE OF name, description, category_id, is_active ON products_product BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.id;
+        {INDEX_PRODUCT} WHERE p.is_active AND p.id = NEW.id;
+    END
+    """,
+    'api_product_search_ad': f"""
+    CREATE TRIGGER api_product_search_ad AFTER DELETE ON products_product BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.id;
+    END
+    """,
+    'api_product_search_category_au': f"""
+    CREATE TRIGGER api_product_search_category_au AFTER UPDATE OF name ON products_category BEGIN
+        UPDATE {SEARCH_TABLE} SET category = NEW.name
+        WHERE rowid IN (SELECT id FROM products_product WHERE category_id = NEW.id);
+    END
+    """,
+    'api_product_search_tag_ai': f"""
+    CREATE TRIGGER api_product_search_tag_ai AFTER INSERT ON products_producttag BEGIN
+        UPDATE {SEARCH_TABLE}
+        SET tags = (SELECT group_concat(name, ' ') FROM products_producttag WHERE product_id = NEW.product_id)
+        WHERE rowid = NEW.product_id;
+    END
+    """,
+    'api_product_search_tag_au': f"""
+    CREATE TRIGGER api_product_search_tag_au AFTER UPDATE ON products_producttag BEGIN
+        UPDATE {SEARCH_TABLE}
+        SET tags = (SELECT group_concat(name, ' ') FROM products_producttag WHERE product_id = OLD.product_id)
+        WHERE rowid = OLD.product_id;
+        UPDATE {SEARCH_TABLE}
+        SET tags = (SELECT group_concat(name, ' ') FROM products_producttag WHERE product_id = NEW.product_id)
+        WHERE rowid = NEW.product_id;
+    END
+    """,
+    'api_product_search_tag_ad': f"""
+    CREATE TRIGGER api_product_search_tag_ad AFTER DELETE ON products_producttag BEGIN
+        UPDATE {SEARCH_TABLE}
+        SET tags = (SELECT group_concat(name, ' ') FROM products_producttag WHERE product_id = OLD.product_id)
+        WHERE rowid = OLD.product_id;
+    END
+    """,
+}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Alias de base de datos -> si tiene la tabla FTS5 (se detecta en la primera búsqueda)
+_fts_tables = {}
+
+
+def build_match_query(term):
+    """Convertir el texto del usuario en una consulta FTS5 segura (AND de prefijos)"""
+    tokens = _TOKEN_RE.findall(term)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def fts_available():
+    if connection.vendor != 'sqlite':
+        return False
+    if connection.alias not in _fts_tables:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT 1 FROM {SEARCH_TABLE} LIMIT 0")
+            _fts_tables[connection.alias] = True
+        except OperationalError:
+            # Sin FTS5 o sin la migración 0008 aplicada
+            _fts_tables[connection.alias] = False
+    return _fts_tables[connection.alias]
+
+
+def search_products(queryset, term):
+    """Filtrar ``queryset`` por ``term`` y ordenarlo por relevancia"""
+    if not fts_available():
+        return queryset.filter(
+            Q(name__icontains=term) |
+            Q(description__icontains=term) |
+            Q(category__name__icontains=term)
+        )
+    match = build_match_query(term)
+    if not match:
+        return queryset.none()
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    product_table = queryset.model._meta.db_table
+    # Subconsultas parametrizadas sobre el índice: los filtros del queryset
+    # (categoría, is_active) se aplican junto con el MATCH y no hay tope de resultados.
+    # El CTE MATERIALIZED no depende de la fila, así que SQLite evalúa el MATCH del
+    # ranking una sola vez; correlacionarlo repetiría la búsqueda por cada producto
+    rank = RawSQL(
+        f'WITH ranked AS MATERIALIZED ('
+        f'SELECT rowid AS id, bm25({SEARCH_TABLE}, {weights}) AS rank '
+        f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+        f') SELECT rank FROM ranked WHERE ranked.id = {product_table}.id',
+        [match],
+    )
+    matches = RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [match])
+    return (
+        queryset.filter(pk__in=matches)
+        .annotate(search_rank=rank)
+        .order_by('search_rank')
+    )
+
+
+def _has_search_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SEARCH_TABLE])
+        return cursor.fetchone() is not None
+
+
+def drop_search_triggers(using=None, plan=None, **kwargs):
+    """pre_migrate: quitar los triggers para que las migraciones puedan recrear tablas"""
+    conn = connections[using or 'default']
+    if conn.vendor != 'sqlite' or not plan:
+        return
+    with conn.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def install_search_triggers(using=None, plan=None, **kwargs):
+    """post_migrate: recrear los triggers y reindexar (las migraciones corrieron sin ellos)"""
+    conn = connections[using or 'default']
+    if conn.vendor != 'sqlite' or not plan or not _has_search_table(conn):
+        return
+    with conn.cursor() as cursor:
+        for name, trigger in TRIGGERS.items():
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(trigger)
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cursor.execute(INDEX_PRODUCT + ' WHERE p.is_active')
@@ -1,6 +1,14 @@
+import logging
+
+from django.db import transaction
 from rest_framework import serializers
 from products.models import Category, Product, ProductTag, Ingredient, ProductIngredient
-from .models import HeroSection, AboutSection, ContactInfo, FeaturedProduct, Order, OrderItem, OrderItemExtra, OrderItemIngredient
+from .models import HeroSection, AboutSection, ContactInfo, FeaturedProduct, Order, OrderItem, OrderItemExtra
+from .cart import CartResolver
+from .log import log_event
+from .rollups import record_order
+
+logger = logging.getLogger(__name__)
 
 class ProductTagSerializer(serializers.ModelSerializer):
     class Meta:
@@ -15,7 +23,8 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'icon', 'products_count']
     
     def get_products_count(self, obj):
-        return obj.products.filter(is_active=True).count()
+        # Contador mantenido en Category (ver Product.save)
+        return obj.active_products_count
 
 # NUEVOS SERIALIZERS PARA INGREDIENTES
 class IngredientSerializer(serializers.ModelSerializer):
@@ -127,14 +136,9 @@ class OrderItemExtraSerializer(serializers.ModelSerializer):
         model = OrderItemExtra
         fields = ['id', 'ingredient', 'ingredient_name', 'quantity', 'unit_price', 'total_price']
 
-class OrderItemIngredientSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = OrderItemIngredient
-        fields = ['id', 'ingredient', 'ingredient_name', 'is_included', 'was_default']
-
 class OrderItemSerializer(serializers.ModelSerializer):
     extras = OrderItemExtraSerializer(many=True, read_only=True)
-    ingredients = OrderItemIngredientSerializer(many=True, read_only=True)  # Nuevo campo
+    ingredients = serializers.ListField(source='get_ingredients', read_only=True)
     
     class Meta:
         model = OrderItem
@@ -151,6 +155,105 @@ class OrderSerializer(serializers.ModelSerializer):
                  'delivery_city', 'delivery_region', 'notes', 'status', 'total_amount',
                  'created_at', 'updated_at', 'items']
         read_only_fields = ['order_number', 'created_at', 'updated_at']
+    
+    def validate_status(self, value):
+        """Solo transiciones permitidas al editar un pedido existente"""
+        if self.instance and value != self.instance.status and not Order.can_transition(self.instance.status, value):
+            raise serializers.ValidationError(f"No se puede cambiar el estado de {self.instance.status} a {value}")
+        return value
+
+# Lectura de pedidos sobre filas planas: una consulta por nivel (pedidos, items,
+# extras) sin instanciar modelos ni serializers anidados. Los ingredientes ya
+# vienen empaquetados en la fila del item
+ORDER_ROW_FIELDS = [f for f in OrderSerializer.Meta.fields if f != 'items']
+
+def serialize_order_rows(rows):
+    """Convertir filas ``values(*ORDER_ROW_FIELDS)`` al mismo formato que OrderSerializer"""
+    rows = list(rows)
+    if not rows:
+        return []
+    datetime_field = serializers.DateTimeField()
+    order_ids = [row['id'] for row in rows]
+    
+    extras_by_item = {}
+    for extra in OrderItemExtra.objects.filter(order_item__order_id__in=order_ids).order_by('id').values(
+        'id', 'order_item_id', 'ingredient_id', 'ingredient_name', 'quantity', 'unit_price', 'total_price'
+    ):
+        extras_by_item.setdefault(extra.pop('order_item_id'), []).append({
+            'id': extra['id'],
+            'ingredient': extra['ingredient_id'],
+            'ingredient_name': extra['ingredient_name'],
+            'quantity': extra['quantity'],
+            'unit_price': extra['unit_price'],
+            'total_price': extra['total_price'],
+        })
+    
+    items_by_order = {}
+    for item in OrderItem.objects.filter(order_id__in=order_ids).order_by('id').values(
+        'id', 'order_id', 'product_id', 'product_name', 'product_description', 'quantity',
+        'unit_price', 'total_price', 'ingredient_selection'
+    ):
+        items_by_order.setdefault(item['order_id'], []).append({
+            'id': item['id'],
+            'product': item['product_id'],
+            'product_name': item['product_name'],
+            'product_description': item['product_description'],
+            'quantity': item['quantity'],
+            'unit_price': item['unit_price'],
+            'total_price': item['total_price'],
+            'extras': extras_by_item.get(item['id'], []),
+            'ingredients': OrderItem.unpack_ingredients(item['ingredient_selection']),
+        })
+    
+    data = []
+    for row in rows:
+        order = {field: row[field] for field in ORDER_ROW_FIELDS}
+        order['created_at'] = datetime_field.to_representation(row['created_at'])
+        order['updated_at'] = datetime_field.to_representation(row['updated_at'])
+        order['items'] = items_by_order.get(row['id'], [])
+        data.append(order)
+    return data
+
+class CartQuoteSerializer(serializers.Serializer):
+    # Mismo formato de items que CreateOrderSerializer
+    items = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+class BulkOrderStatusSerializer(serializers.Serializer):
+    # Pedidos por id y/o número de pedido
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list, max_length=500)
+    order_numbers = serializers.ListField(child=serializers.CharField(max_length=20), required=False, default=list, max_length=500)
+    
+    def validate(self, data):
+        if not data['ids'] and not data['order_numbers']:
+            raise serializers.ValidationError("Debe indicar 'ids' u 'order_numbers'")
+        return data
+
+class PriceAdjustmentSerializer(serializers.Serializer):
+    # Precios de productos (por categoría, tag o ids) o costo de un extra
+    target = serializers.ChoiceField(choices=['products', 'extras'], default='products')
+    mode = serializers.ChoiceField(choices=['percent', 'amount'])
+    value = serializers.DecimalField(max_digits=10, decimal_places=2)
+    category = serializers.CharField(max_length=100, required=False)
+    tag = serializers.CharField(max_length=50, required=False)
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    ingredient = serializers.IntegerField(required=False)
+    dry_run = serializers.BooleanField(default=False)
+    
+    def validate(self, data):
+        if data['value'] == 0:
+            raise serializers.ValidationError("El ajuste no puede ser 0")
+        if data['mode'] == 'percent' and data['value'] <= -100:
+            raise serializers.ValidationError("El porcentaje debe ser mayor a -100")
+        if data['target'] == 'extras':
+            if 'ingredient' not in data:
+                raise serializers.ValidationError("Debe indicar 'ingredient' para ajustar extras")
+        elif 'ingredient' in data:
+            raise serializers.ValidationError("'ingredient' solo aplica a target 'extras'")
+        elif not (data.get('category') or data.get('tag') or data['ids']):
+            raise serializers.ValidationError("Debe indicar 'category', 'tag' o 'ids'")
+        return data
+
 
 class CreateOrderSerializer(serializers.Serializer):
     # Información del cliente
@@ -175,52 +278,24 @@ class CreateOrderSerializer(serializers.Serializer):
     
     def validate(self, data):
         """Validar los datos antes de crear la orden"""
-        print("=== DATOS RECIBIDOS EN EL SERIALIZER ===")
-        print(f"Data completa: {data}")
-        print(f"Items: {data.get('items', [])}")
-        
         # Validar que hay items
         items = data.get('items', [])
         if not items:
             raise serializers.ValidationError("Debe incluir al menos un item en el pedido")
         
-        # Validar cada item
-        for i, item in enumerate(items):
-            print(f"Item {i}: {item}")
-            
-            # Verificar que el producto existe
-            product_id = item.get('product_id')
-            if not product_id:
-                raise serializers.ValidationError(f"Item {i}: product_id es requerido")
-            
-            try:
-                from products.models import Product
-                product = Product.objects.get(id=product_id)
-                print(f"Producto encontrado: {product.name}")
-            except Product.DoesNotExist:
-                raise serializers.ValidationError(f"Item {i}: Producto con ID {product_id} no existe")
-            except ValueError:
-                raise serializers.ValidationError(f"Item {i}: product_id debe ser un número válido")
-            
-            # Verificar quantity
-            quantity = item.get('quantity')
-            if not quantity:
-                raise serializers.ValidationError(f"Item {i}: quantity es requerido")
-            
-            try:
-                quantity_int = int(quantity)
-                if quantity_int <= 0:
-                    raise serializers.ValidationError(f"Item {i}: quantity debe ser mayor a 0")
-            except ValueError:
-                raise serializers.ValidationError(f"Item {i}: quantity debe ser un número válido")
+        # Resolver productos, extras e ingredientes del carrito completo;
+        # create() reutiliza este resultado sin volver a consultar
+        self.cart = CartResolver(items).resolve()
+        if self.cart.errors:
+            log_event(logger, logging.INFO, 'order.invalid', errors=self.cart.errors)
+            raise serializers.ValidationError(self.cart.errors)
         
         return data
     
+    @transaction.atomic
     def create(self, validated_data):
-        print("=== CREANDO ORDEN ===")
-        print(f"Validated data: {validated_data}")
-        
-        items_data = validated_data.pop('items')
+        validated_data.pop('items')
+        cart = self.cart
         
         # Crear la dirección completa
         delivery_address = f"{validated_data['delivery_street']} {validated_data['delivery_number']}"
@@ -230,111 +305,57 @@ class CreateOrderSerializer(serializers.Serializer):
         
         validated_data['delivery_address'] = delivery_address
         
-        # Calcular el total del pedido
-        total_amount = 0
-        
-        # Crear el pedido
-        order = Order.objects.create(**validated_data, total_amount=0)
-        print(f"Orden creada con ID: {order.id}")
+        # Crear el pedido con su total ya calculado (un solo INSERT)
+        total_amount = cart.total_amount
+        order = Order.objects.create(**validated_data, total_amount=total_amount)
         
-        # Crear los items del pedido
-        for item_data in items_data:
-            print(f"Procesando item: {item_data}")
-            
-            from products.models import Product, ProductIngredient
-            product = Product.objects.get(id=item_data['product_id'])
-            quantity = int(item_data['quantity'])
-            
-            # Calcular precio unitario (precio base + extras)
-            unit_price = float(product.price)
-            
-            # Procesar extras si existen
-            extras_data = item_data.get('extras', {})
-            extras_total = 0
-            
-            for ingredient_id, extra_quantity in extras_data.items():
-                if int(extra_quantity) > 0:
-                    try:
-                        product_ingredient = ProductIngredient.objects.get(
-                            product=product, 
-                            ingredient_id=ingredient_id
-                        )
-                        extras_total += float(product_ingredient.extra_cost) * int(extra_quantity)
-                    except ProductIngredient.DoesNotExist:
-                        print(f"ProductIngredient no encontrado para producto {product.id} e ingrediente {ingredient_id}")
-                        continue
-            
-            unit_price += extras_total
-            total_price = unit_price * quantity
-            
-            # Crear el item del pedido
-            order_item = OrderItem.objects.create(
+        order_items = OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
-                product=product,
-                product_name=product.name,
-                product_description=product.description,
-                quantity=quantity,
-                unit_price=unit_price,
-                total_price=total_price
+                product=line.product,
+                product_name=line.product.name,
+                product_description=line.product.description,
+                quantity=line.quantity,
+                unit_price=line.unit_price,
+                total_price=line.total_price,
+                # Ingredientes del item (incluidos/excluidos), en la misma fila
+                ingredient_selection=[
+                    OrderItem.pack_ingredient(
+                        product_ingredient.ingredient_id,
+                        product_ingredient.ingredient.name,
+                        is_included,
+                        product_ingredient.default_included
+                    )
+                    for product_ingredient, is_included in line.ingredients
+                ]
             )
-            print(f"OrderItem creado: {order_item.id}")
-            
-            # Crear los extras del item
-            for ingredient_id, extra_quantity in extras_data.items():
-                if int(extra_quantity) > 0:
-                    try:
-                        product_ingredient = ProductIngredient.objects.get(
-                            product=product, 
-                            ingredient_id=ingredient_id
-                        )
-                        ingredient = product_ingredient.ingredient
-                        extra_unit_price = float(product_ingredient.extra_cost)
-                        extra_total_price = extra_unit_price * int(extra_quantity)
-                        
-                        OrderItemExtra.objects.create(
-                            order_item=order_item,
-                            ingredient=ingredient,
-                            ingredient_name=ingredient.name,
-                            quantity=int(extra_quantity),
-                            unit_price=extra_unit_price,
-                            total_price=extra_total_price
-                        )
-                        print(f"OrderItemExtra creado para ingrediente {ingredient.name}")
-                    except ProductIngredient.DoesNotExist:
-                        print(f"ProductIngredient no encontrado para extra: producto {product.id}, ingrediente {ingredient_id}")
-                        continue
-            
-            # Crear los ingredientes del item (incluidos/excluidos)
-            from products.models import ProductIngredient
-            product_ingredients = ProductIngredient.objects.filter(product=product, is_active=True)
-            
-            # Obtener ingredientes incluidos del frontend (si se envían)
-            included_ingredients = item_data.get('included_ingredients', [])
-            
-            for product_ingredient in product_ingredients:
-                ingredient = product_ingredient.ingredient
-                was_default = product_ingredient.default_included
-                
-                # Si se enviaron ingredientes incluidos específicos, usar esa lista
-                # Si no, usar los valores por defecto
-                if included_ingredients:
-                    is_included = str(ingredient.id) in included_ingredients
-                else:
-                    is_included = was_default
-                
-                OrderItemIngredient.objects.create(
+            for line in cart.lines
+        ])
+        
+        item_extras = []
+        for order_item, line in zip(order_items, cart.lines):
+            for product_ingredient, extra_quantity, extra_unit_price in line.extras:
+                item_extras.append(OrderItemExtra(
                     order_item=order_item,
-                    ingredient=ingredient,
-                    ingredient_name=ingredient.name,
-                    is_included=is_included,
-                    was_default=was_default
-                )
-            
-            total_amount += total_price
+                    ingredient=product_ingredient.ingredient,
+                    ingredient_name=product_ingredient.ingredient.name,
+                    quantity=extra_quantity,
+                    unit_price=extra_unit_price,
+                    total_price=extra_unit_price * extra_quantity
+                ))
         
-        # Actualizar el total del pedido
-        order.total_amount = total_amount
-        order.save()
+        OrderItemExtra.objects.bulk_create(item_extras)
+        record_order(order, cart)
         
-        print(f"Orden completada con total: {total_amount}")
-        return order
\ No newline at end of file
+        log_event(
+            logger, logging.INFO, 'order.created',
+            order_number=order.order_number, items=len(order_items), total=total_amount
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            for line in cart.lines:
+                log_event(
+                    logger, logging.DEBUG, 'order.line',
+                    order_number=order.order_number, product_id=line.product.id,
+                    quantity=line.quantity, unit_price=line.unit_price, extras=len(line.extras)
+                )
+        return order
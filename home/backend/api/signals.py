@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from products.models import Category, Product, ProductTag, Ingredient, ProductIngredient
+from .menu import invalidate_menu
+from .pricing import invalidate_prices
+
+CATALOG_MODELS = (Category, Product, ProductTag, Ingredient, ProductIngredient)
+PRICING_MODELS = (Product, ProductIngredient)
+
+
+def invalidate(callback):
+    # Invalidar ya (lecturas dentro de la misma transacción) y de nuevo al hacer
+    # commit, para descartar lo que otro proceso haya cargado antes de confirmar
+    callback()
+    transaction.on_commit(callback)
+
+
+def catalog_changed(sender, **kwargs):
+    """Invalidar el snapshot del menú cuando cambia un modelo del catálogo"""
+    invalidate(invalidate_menu)
+
+
+def prices_changed(sender, **kwargs):
+    """Invalidar la tabla de precios cuando cambia un producto o un extra"""
+    invalidate(invalidate_prices)
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(catalog_changed, sender=model, dispatch_uid=f'menu_save_{model.__name__}')
+    post_delete.connect(catalog_changed, sender=model, dispatch_uid=f'menu_delete_{model.__name__}')
+
+for model in PRICING_MODELS:
+    post_save.connect(prices_changed, sender=model, dispatch_uid=f'pricing_save_{model.__name__}')
+    post_delete.connect(prices_changed, sender=model, dispatch_uid=f'pricing_delete_{model.__name__}')
@@ -0,0 +1,80 @@
+"""Stream de pedidos en vivo (Server-Sent Events) para cocina/admin.
+
+Es una vista async de Django, no de DRF: cada cliente conectado ocupa una
+corrutina en vez de un hilo, así que se debe servir con el ``application`` de
+``fastfood/asgi.py`` (p. ej. ``uvicorn fastfood.asgi:application``). Bajo WSGI
+cada conexión bloquearía un worker completo.
+"""
+import asyncio
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.authtoken.models import Token
+
+from .events import hub
+
+RETRY_MS = 3000
+RESET_EVENT = 'event: reset\ndata: {}\n\n'
+
+
+async def stream_user(request):
+    """Usuario del stream: token (cabecera o ?token=, EventSource no envía cabeceras) o sesión"""
+    header = request.headers.get('Authorization', '')
+    key = header[len('Token '):] if header.startswith('Token ') else request.GET.get('token')
+    if key:
+        token = await Token.objects.select_related('user').filter(key=key).afirst()
+        return token.user if token and token.user.is_active else None
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def parse_last_event_id(request):
+    value = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+async def order_events(last_event_id):
+    """Reenviar lo perdido desde ``last_event_id`` y luego los eventos en vivo"""
+    heartbeat = getattr(settings, 'ORDER_STREAM_HEARTBEAT', 15)
+    subscription, missed, complete = hub.subscribe(last_event_id)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        if not complete:
+            yield RESET_EVENT
+        for event in missed:
+            yield event.encode()
+        while not subscription.overflowed:
+            try:
+                event = await subscription.get(heartbeat)
+            except asyncio.TimeoutError:
+                # Comentario SSE para mantener viva la conexión a través de proxies
+                yield ": ping\n\n"
+                continue
+            yield event.encode()
+        yield RESET_EVENT
+    finally:
+        hub.unsubscribe(subscription)
+
+
+async def order_stream_view(request):
+    """Eventos order.created / order.status_changed / order.updated para staff"""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    user = await stream_user(request)
+    if user is None:
+        return JsonResponse({'error': 'Autenticación requerida'}, status=401)
+    if not user.is_staff:
+        return JsonResponse({'error': 'Solo administradores'}, status=403)
+
+    response = StreamingHttpResponse(
+        order_events(parse_last_event_id(request)),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Evitar que nginx acumule el stream
+    return response
@@ -1,3 +1,1359 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from io import StringIO
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.models import F
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from products.models import Category, Product, ProductTag, Ingredient, ProductIngredient
+from .catalog_io import CSV_COLUMNS as CATALOG_CSV_COLUMNS
+from .events import OrderEventHub, get_broker, hub
+from .export import CSV_COLUMNS
+from .intake import process_batch
+from .log import JsonFormatter, request_id
+from .middleware import RequestIdMiddleware
+from .search import TRIGGERS, drop_search_triggers, fts_available, install_search_triggers, search_products
+from .serializers import OrderSerializer
+from .views import OrderViewSet
+from .models import (
+    Order, OrderItem, OrderItemExtra, OrderIntake, IdempotencyKey, DailyProductSales, DailyExtraSales,
+    DataVersion,
+)
+
+
+def create_catalog(products_per_category=3, categories=2, ingredients_per_product=3):
+    """Crear un catálogo de prueba con tags e ingredientes por producto"""
+    ingredients = [
+        Ingredient.objects.create(name=f"Ingrediente {i}")
+        for i in range(ingredients_per_product)
+    ]
+    created = []
+    for c in range(categories):
+        category = Category.objects.create(name=f"Categoría {c}", icon="🍔")
+        for p in range(products_per_category):
+            product = Product.objects.create(
+                name=f"Producto {c}-{p}",
+                description="Producto de prueba",
+                price=Decimal('10.00'),
+                category=category,
+            )
+            ProductTag.objects.create(product=product, name="Popular")
+            ProductTag.objects.create(product=product, name="Nuevo")
+            for i, ingredient in enumerate(ingredients):
+                ProductIngredient.objects.create(
+                    product=product,
+                    ingredient=ingredient,
+                    default_included=i % 2 == 0,
+                    extra_cost=Decimal('1.50'),
+                )
+            created.append(product)
+    return created
+
+
+class CatalogQueryBudgetTests(TestCase):
+    """Cada endpoint del catálogo debe responder con un número fijo de consultas"""
+
+    # (nombre, método que construye la URL, consultas máximas, requiere admin)
+    QUERY_BUDGETS = [
+        ('categories-list', lambda t: '/api/categories/', 1, False),
+        ('category-products', lambda t: f'/api/categories/{t.category.id}/products/', 4, True),
+        ('products-list', lambda t: '/api/products/', 3, False),
+        ('products-list-filtered', lambda t: f'/api/products/?category={t.category.name}&search=Producto', 3, False),
+        ('products-retrieve', lambda t: f'/api/products/{t.product.id}/', 4, False),
+        ('products-featured', lambda t: '/api/products/featured/', 3, False),
+        ('products-search', lambda t: '/api/products/search/?q=Producto', 3, False),
+    ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        # Detección única por proceso de la tabla FTS5; no cuenta para cada solicitud
+        fts_available()
+
+    def _count_queries(self, url, as_admin):
+        self.client.force_authenticate(self.admin if as_admin else None)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(ctx.captured_queries)
+
+    def _assert_budgets(self):
+        counts = {}
+        for name, build_url, budget, as_admin in self.QUERY_BUDGETS:
+            count = self._count_queries(build_url(self), as_admin)
+            self.assertLessEqual(
+                count, budget,
+                f"{name} ejecutó {count} consultas (presupuesto: {budget})"
+            )
+            counts[name] = count
+        return counts
+
+    def test_budgets_hold_and_do_not_grow_with_catalog_size(self):
+        products = create_catalog(products_per_category=2)
+        self.product = products[0]
+        self.category = self.product.category
+        small = self._assert_budgets()
+
+        create_catalog(products_per_category=25, ingredients_per_product=0)
+        large = self._assert_budgets()
+
+        self.assertEqual(small, large)
+
+
+class MenuSnapshotTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = create_catalog(products_per_category=2)[0]
+
+    def test_menu_contains_catalog_and_etag(self):
+        response = self.client.get('/api/menu/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['categories']), 2)
+        self.assertEqual(len(data['products']), 4)
+        self.assertEqual(data['tags'], ['Nuevo', 'Popular'])
+        self.assertEqual(response['ETag'], f'"menu-{data["version"]}"')
+
+    def test_snapshot_is_reused_and_answers_304(self):
+        etag = self.client.get('/api/menu/')['ETag']
+        # Solo se lee la versión: el 304 no arma el snapshot
+        with mock.patch('api.views.get_menu_snapshot') as snapshot, self.assertNumQueries(1):
+            response = self.client.get('/api/menu/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        snapshot.assert_not_called()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/menu/').status_code, 200)
+
+    def test_version_is_shared_between_workers(self):
+        etag = self.client.get('/api/menu/')['ETag']
+        # Otro worker tiene su propio cache en memoria, pero lee la misma versión
+        cache.clear()
+        self.assertEqual(self.client.get('/api/menu/')['ETag'], etag)
+        DataVersion.objects.filter(key='menu:version').update(value=F('value') + 1)
+        self.assertNotEqual(self.client.get('/api/menu/')['ETag'], etag)
+
+    def test_catalog_change_bumps_version(self):
+        etag = self.client.get('/api/menu/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Renombrado'
+            self.product.save()
+        response = self.client.get('/api/menu/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Renombrado', [p['name'] for p in response.json()['products']])
+
+
+def order_payload(products, extras=None, included=None, quantity='2'):
+    """Payload de pedido con el formato que envía Checkout.tsx"""
+    return {
+        'customer_name': 'Ana Pérez',
+        'customer_email': 'ana@example.com',
+        'customer_phone': '+56911111111',
+        'delivery_street': 'Av. Siempre Viva',
+        'delivery_number': '742',
+        'delivery_city': 'Santiago',
+        'delivery_region': 'RM',
+        'items': [
+            {
+                'product_id': str(product.id),
+                'quantity': quantity,
+                'extras': extras or {},
+                'included_ingredients': included or [],
+            }
+            for product in products
+        ],
+    }
+
+
+class CreateOrderTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.products = create_catalog(products_per_category=5)
+        self.extra = self.products[0].product_ingredients.filter(default_included=False).first()
+
+    def test_order_persists_items_extras_and_ingredients(self):
+        payload = order_payload(self.products[:1], extras={str(self.extra.ingredient_id): '2'})
+        response = self.client.post('/api/orders/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        order = Order.objects.get()
+        item = order.items.get()
+        self.assertEqual(item.unit_price, Decimal('13.00'))
+        self.assertEqual(order.total_amount, Decimal('26.00'))
+        self.assertEqual(item.extras.get().quantity, 2)
+        self.assertEqual(len(item.ingredient_selection), 3)
+
+    def test_write_statements_do_not_grow_with_item_count(self):
+        def count_inserts(products):
+            payload = order_payload(products, extras={str(self.extra.ingredient_id): '1'})
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post('/api/orders/', payload, format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+            return len([q for q in ctx.captured_queries if q['sql'].startswith('INSERT')])
+
+        # Pedido, items, extras y las dos tablas de ventas diarias
+        self.assertEqual(count_inserts(self.products[:1]), 5)
+        self.assertEqual(count_inserts(self.products), 5)
+
+    def test_ingredient_selection_keeps_response_shape(self):
+        included = [str(self.extra.ingredient_id)]
+        response = self.client.post('/api/orders/', order_payload(self.products[:1], included=included), format='json')
+        ingredients = response.json()['items'][0]['ingredients']
+        self.assertEqual(len(ingredients), 3)
+        self.assertEqual(
+            set(ingredients[0]), {'id', 'ingredient', 'ingredient_name', 'is_included', 'was_default'}
+        )
+        self.assertEqual(
+            [i['ingredient'] for i in ingredients if i['is_included']], [self.extra.ingredient_id]
+        )
+
+    def test_products_are_read_once_per_order(self):
+        payload = order_payload(self.products, extras={str(self.extra.ingredient_id): '1'})
+        # Los pedidos no usan la tabla de precios: CartResolver lee productos y extras una vez
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/orders/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        catalog_reads = [q for q in ctx.captured_queries if 'FROM "products_' in q['sql']]
+        self.assertEqual(len(catalog_reads), 2)
+
+    def test_invalid_customizations_are_rejected(self):
+        foreign = Ingredient.objects.create(name='Ajeno')
+        payload = order_payload(
+            self.products[:1],
+            extras={str(foreign.id): '1'},
+            included=[str(foreign.id)],
+        )
+        response = self.client.post('/api/orders/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()['non_field_errors']), 2)
+        self.assertFalse(Order.objects.exists())
+
+    def test_failure_leaves_no_partial_order(self):
+        payload = order_payload(self.products[:3])
+        with mock.patch.object(OrderItemExtra.objects, 'bulk_create', side_effect=RuntimeError('boom')), \
+                self.assertLogs('api', level='ERROR'):
+            response = self.client.post('/api/orders/', payload, format='json')
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+
+class PricingTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.product = create_catalog(products_per_category=1, categories=1)[0]
+        self.product.price = Decimal('12.99')
+        self.product.save()
+        self.extra = self.product.product_ingredients.filter(default_included=False).first()
+
+    def test_order_totals_are_exact_decimals(self):
+        payload = order_payload([self.product], quantity='3')
+        response = self.client.post('/api/orders/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Order.objects.get().total_amount, Decimal('38.97'))
+
+    def test_calculate_price_uses_price_table(self):
+        url = f'/api/products/{self.product.id}/calculate_price/'
+        self.client.post(url, {'extra_ids': []}, format='json')
+        # Solo se lee la versión compartida
+        with self.assertNumQueries(1):
+            response = self.client.post(url, {'extra_ids': [self.extra.ingredient_id]}, format='json')
+        self.assertEqual(response.json()['total'], 14.49)
+
+    def test_price_change_invalidates_table(self):
+        url = f'/api/products/{self.product.id}/calculate_price/'
+        self.client.post(url, {'extra_ids': []}, format='json')
+        self.extra.extra_cost = Decimal('2.00')
+        self.extra.save()
+        response = self.client.post(url, {'extra_ids': [self.extra.ingredient_id]}, format='json')
+        self.assertEqual(response.json()['extras_total'], 2.0)
+
+    def test_orders_use_current_rows_not_price_table(self):
+        # Cambios hechos por otro worker: la tabla de este proceso no se entera
+        ProductIngredient.objects.filter(pk=self.extra.pk).update(is_active=False)
+        self.client.post(f'/api/products/{self.product.id}/calculate_price/', {'extra_ids': []}, format='json')
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal('20.00'))
+        ProductIngredient.objects.filter(pk=self.extra.pk).update(is_active=True, extra_cost=Decimal('2.00'))
+
+        payload = order_payload([self.product], extras={str(self.extra.ingredient_id): '1'}, quantity='1')
+        response = self.client.post('/api/orders/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Order.objects.get().total_amount, Decimal('22.00'))
+
+    def test_cart_quote_prices_every_line_and_reports_errors(self):
+        other = create_catalog(products_per_category=1, categories=1, ingredients_per_product=0)[0]
+        items = order_payload([self.product, other], extras={str(self.extra.ingredient_id): '2'})['items']
+        items.append({'product_id': '999999', 'quantity': '1'})
+        response = self.client.post('/api/cart/quote/', {'items': items}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertFalse(data['valid'])
+        self.assertEqual(len(data['errors']), 2)  # extra ajeno en el 2º item y producto inexistente
+        self.assertEqual(len(data['lines']), 1)
+        self.assertEqual(data['lines'][0]['unit_price'], 15.99)
+        self.assertEqual(data['total'], 31.98)
+        with self.assertNumQueries(2):
+            self.client.post('/api/cart/quote/', {'items': items * 20}, format='json')
+
+
+class IdempotencyTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.products = create_catalog(products_per_category=1, categories=1)
+
+    def test_retry_returns_original_response(self):
+        payload = order_payload(self.products)
+        first = self.client.post('/api/orders/', payload, format='json', HTTP_IDEMPOTENCY_KEY='abc-123')
+        second = self.client.post('/api/orders/', payload, format='json', HTTP_IDEMPOTENCY_KEY='abc-123')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(first.json()['order_number'], second.json()['order_number'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reuse_with_different_payload_is_rejected(self):
+        self.client.post('/api/orders/', order_payload(self.products), format='json', HTTP_IDEMPOTENCY_KEY='k')
+        response = self.client.post(
+            '/api/orders/', order_payload(self.products, quantity='5'), format='json', HTTP_IDEMPOTENCY_KEY='k'
+        )
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_in_flight_duplicate_times_out_with_conflict(self):
+        IdempotencyKey.objects.create(
+            key='en-curso', request_hash=hashlib.sha256(
+                JSONRenderer().render(order_payload(self.products))
+            ).hexdigest(),
+            expires_at=timezone.now() + timedelta(minutes=5),
+        )
+        with self.settings(ORDER_IDEMPOTENCY_WAIT=0):
+            response = self.client.post(
+                '/api/orders/', order_payload(self.products), format='json', HTTP_IDEMPOTENCY_KEY='en-curso'
+            )
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+    def test_abandoned_reservation_is_reclaimed(self):
+        payload = order_payload(self.products)
+        record = IdempotencyKey.objects.create(
+            key='abandonada', request_hash=hashlib.sha256(JSONRenderer().render(payload)).hexdigest(),
+            expires_at=timezone.now() + timedelta(hours=24),
+        )
+        IdempotencyKey.objects.filter(pk=record.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+        with self.settings(ORDER_IDEMPOTENCY_WAIT=0):
+            response = self.client.post('/api/orders/', payload, format='json', HTTP_IDEMPOTENCY_KEY='abandonada')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(IdempotencyKey.objects.get(key='abandonada').response_status, 201)
+
+
+@override_settings(ORDER_INTAKE_MODE='queue')
+class OrderIntakeQueueTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.products = create_catalog(products_per_category=2, categories=1)
+
+    def test_post_is_acknowledged_and_worker_creates_order(self):
+        response = self.client.post('/api/orders/', order_payload(self.products), format='json')
+        self.assertEqual(response.status_code, 202)
+        order_number = response.json()['order_number']
+        self.assertFalse(Order.objects.exists())
+
+        self.assertEqual(process_batch(), (1, 0))
+        order = Order.objects.get()
+        self.assertEqual(order.order_number, order_number)
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(OrderIntake.objects.get().status, 'processed')
+
+    def test_failed_intake_does_not_block_the_batch(self):
+        self.client.post('/api/orders/', order_payload(self.products[:1]), format='json')
+        self.client.post('/api/orders/', order_payload(self.products[1:]), format='json')
+        self.products[0].delete()
+
+        self.assertEqual(process_batch(), (1, 1))
+        failed = OrderIntake.objects.get(status='failed')
+        self.assertIn('no existe', failed.error)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_database_error_keeps_the_batch_pending(self):
+        self.client.post('/api/orders/', order_payload(self.products[:1]), format='json')
+        self.client.post('/api/orders/', order_payload(self.products[1:]), format='json')
+        locked = OperationalError('database is locked')
+        with mock.patch('api.intake.CreateOrderSerializer.save', side_effect=locked):
+            with self.assertRaises(OperationalError):
+                process_batch()
+        self.assertEqual(OrderIntake.objects.filter(status='pending').count(), 2)
+
+        self.assertEqual(process_batch(), (2, 0))
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_invalid_cart_is_rejected_before_queueing(self):
+        payload = order_payload(self.products, quantity='0')
+        response = self.client.post('/api/orders/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(OrderIntake.objects.exists())
+
+
+class StructuredLoggingTests(TestCase):
+
+    def test_request_id_is_propagated(self):
+        response = APIClient().get('/api/categories/', HTTP_X_REQUEST_ID='req-42')
+        self.assertEqual(response['X-Request-ID'], 'req-42')
+
+    async def test_request_id_under_asgi_without_thread(self):
+        seen = []
+
+        async def view(request):
+            seen.append(request_id.get())
+            return HttpResponse()
+
+        middleware = RequestIdMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/', HTTP_X_REQUEST_ID='req-43'))
+        self.assertEqual((seen, response['X-Request-ID']), (['req-43'], 'req-43'))
+        response = await AsyncClient().get('/api/categories/', headers={'X-Request-ID': 'req-44'})
+        self.assertEqual(response['X-Request-ID'], 'req-44')
+
+    def test_order_events_carry_no_customer_data(self):
+        products = create_catalog(products_per_category=1, categories=1)
+        with self.assertLogs('api', level='INFO') as logs:
+            APIClient().post('/api/orders/', order_payload(products), format='json')
+        record = logs.records[-1]
+        self.assertEqual(record.getMessage(), 'order.created')
+        self.assertEqual(set(record.fields), {'order_number', 'items', 'total'})
+        formatted = JsonFormatter().format(record)
+        self.assertNotIn('ana@example.com', formatted)
+
+
+class ProductSearchTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        burgers = Category.objects.create(name='Hamburguesas', icon='🍔')
+        drinks = Category.objects.create(name='Bebidas', icon='🥤')
+        self.classic = Product.objects.create(
+            name='Hamburguesa Clásica', description='Carne, lechuga y tomate', price=Decimal('12.99'), category=burgers
+        )
+        self.bbq = Product.objects.create(
+            name='Hamburguesa BBQ', description='Con salsa barbacoa', price=Decimal('15.99'), category=burgers
+        )
+        self.lemonade = Product.objects.create(
+            name='Limonada', description='Natural, ideal con una hamburguesa', price=Decimal('3.50'), category=drinks
+        )
+
+    def search(self, term):
+        response = self.client.get('/api/products/search/', {'q': term})
+        return [p['name'] for p in response.json()]
+
+    def test_accents_are_folded_and_words_match_as_prefixes(self):
+        self.assertEqual(self.search('hamburguesa clasica'), ['Hamburguesa Clásica'])
+        self.assertEqual(self.search('CLÁS'), ['Hamburguesa Clásica'])
+
+    def test_results_are_ordered_by_relevance(self):
+        names = self.search('hamburguesa')
+        self.assertEqual(names[-1], 'Limonada')
+        self.assertEqual(len(names), 3)
+
+    def test_search_queryset_stays_composable(self):
+        results = search_products(Product.objects.all(), 'hamburguesa')
+        self.assertEqual(results.filter(name__contains='BBQ').count(), 1)
+        ranks = list(results.values_list('search_rank', flat=True))
+        self.assertEqual(ranks, sorted(ranks))
+
+    def test_index_follows_tags_categories_and_active_flag(self):
+        ProductTag.objects.create(product=self.lemonade, name='Refrescante')
+        self.assertEqual(self.search('refresc'), ['Limonada'])
+
+        Category.objects.filter(name='Bebidas').update(name='Jugos')
+        self.assertEqual(self.search('jugos'), ['Limonada'])
+
+        self.bbq.is_active = False
+        self.bbq.save()
+        self.assertNotIn('Hamburguesa BBQ', self.search('barbacoa'))
+
+    def test_search_filter_on_list_endpoint(self):
+        response = self.client.get('/api/products/', {'search': 'limon'})
+        self.assertEqual([p['name'] for p in response.json()], ['Limonada'])
+
+    def test_triggers_are_suspended_while_migrating(self):
+        def triggers():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'api_product_search%%'")
+                return cursor.fetchone()[0]
+
+        plan = [('migración', False)]
+        drop_search_triggers(using='default', plan=plan)
+        self.assertEqual(triggers(), 0)
+        # Cambios hechos durante la migración, sin triggers
+        Product.objects.filter(pk=self.lemonade.pk).update(name='Naranjada')
+        install_search_triggers(using='default', plan=plan)
+        self.assertEqual(triggers(), len(TRIGGERS))
+        self.assertEqual(self.search('naranj'), ['Naranjada'])
+
+    def test_search_applies_category_filter_without_cap(self):
+        pizzas = Category.objects.create(name='Pizzas', icon='🍕')
+        Product.objects.bulk_create([
+            Product(name=f'Pizza {i}', description='Masa fina', price=Decimal('9.99'), category=pizzas)
+            for i in range(250)
+        ])
+        Product.objects.create(
+            name='Pizza Burger', description='Mitad y mitad', price=Decimal('13.99'), category=self.classic.category
+        )
+        response = self.client.get('/api/products/', {'category': 'Hamburguesas', 'search': 'pizza'})
+        self.assertEqual([p['name'] for p in response.json()], ['Pizza Burger'])
+        response = self.client.get('/api/products/', {'search': 'pizza'})
+        self.assertEqual(len(response.json()), 251)
+
+
+class OrderListPaginationTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        products = create_catalog(products_per_category=1, categories=1)
+        for i in range(7):
+            payload = order_payload(products)
+            payload['delivery_city'] = 'Valparaíso' if i % 2 else 'Santiago'
+            payload['customer_phone'] = f'+5690000000{i}'
+            APIClient().post('/api/orders/', payload, format='json')
+        # Mismo created_at para varios pedidos: el cursor desempata por id
+        Order.objects.filter(id__lte=4).update(created_at=timezone.now() - timedelta(days=2))
+
+    def walk(self, url):
+        numbers = []
+        while url:
+            data = self.client.get(url).json()
+            numbers += [order['order_number'] for order in data['results']]
+            url = data['next']
+        return numbers
+
+    def test_cursor_walks_every_order_once_in_order(self):
+        numbers = self.walk('/api/orders/?page_size=2')
+        expected = list(Order.objects.order_by('-created_at', '-id').values_list('order_number', flat=True))
+        self.assertEqual(numbers, expected)
+
+    def test_filters(self):
+        self.assertEqual(len(self.walk('/api/orders/?city=Valparaíso')), 3)
+        self.assertEqual(len(self.walk('/api/orders/?phone=%2B56900000005')), 1)
+        yesterday = (timezone.localdate() - timedelta(days=1)).isoformat()
+        self.assertEqual(len(self.walk(f'/api/orders/?created_to={yesterday}')), 4)
+        self.assertEqual(len(self.walk(f'/api/orders/?created_from={yesterday}&status=pending')), 3)
+
+    def test_invalid_cursor_and_dates_are_rejected(self):
+        self.assertEqual(self.client.get('/api/orders/?cursor=nope').status_code, 400)
+        self.assertEqual(self.client.get('/api/orders/?created_from=ayer').status_code, 400)
+
+
+class OrderReadTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        self.products = create_catalog(products_per_category=3, categories=1)
+        self.extra = self.products[0].product_ingredients.filter(default_included=False).first()
+
+    def place_orders(self, count):
+        for _ in range(count):
+            payload = order_payload(self.products, extras={str(self.extra.ingredient_id): '1'})
+            APIClient().post('/api/orders/', payload, format='json')
+
+    def test_row_serialization_matches_order_serializer(self):
+        self.place_orders(1)
+        order = Order.objects.get()
+        expected = JSONRenderer().render(OrderSerializer(order).data)
+        response = self.client.get(f'/api/orders/{order.id}/')
+        self.assertEqual(response.content, expected)
+
+    def test_list_and_detail_use_one_query_per_level(self):
+        self.place_orders(2)
+        with self.assertNumQueries(3):
+            self.client.get('/api/orders/')
+        self.place_orders(8)
+        with self.assertNumQueries(3):
+            data = self.client.get('/api/orders/').json()
+        self.assertEqual(len(data['results']), 10)
+        self.assertEqual(len(data['results'][0]['items'][0]['extras']), 1)
+        order_id = Order.objects.first().id
+        with self.assertNumQueries(3):
+            self.client.get(f'/api/orders/{order_id}/')
+
+
+class OrderStreamTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.token = Token.objects.create(user=self.admin)
+        self.products = create_catalog(products_per_category=1, categories=1)
+
+    def test_hub_resumes_from_last_event_id(self):
+        async def scenario():
+            local = OrderEventHub(history_size=3)
+            for n in range(5):
+                local.dispatch(n + 1, 'order.created', {'n': n})
+            _, missed, complete = local.subscribe(last_event_id=3)
+            self.assertTrue(complete)
+            self.assertEqual([event.id for event in missed], [4, 5])
+            # El evento 2 ya salió del historial: el cliente debe resincronizar
+            _, missed, complete = local.subscribe(last_event_id=1)
+            self.assertFalse(complete)
+            # Un id mayor que el último visto (otro worker adelantado) tampoco es reanudable
+            _, _, complete = local.subscribe(last_event_id=9)
+            self.assertFalse(complete)
+            subscription, _, _ = local.subscribe()
+            local.dispatch(6, 'order.status_changed', {'n': 5})
+            event = await subscription.get(timeout=1)
+            self.assertEqual((event.id, event.type), (6, 'order.status_changed'))
+        asyncio.run(scenario())
+
+    def test_ids_come_from_the_broker(self):
+        async def scenario():
+            # Dos workers que reciben los mismos eventos del canal compartido
+            first, second = OrderEventHub(), OrderEventHub()
+            for event_id in (41, 42, 43):
+                first.dispatch(event_id, 'order.created', {})
+            second.dispatch(43, 'order.created', {})
+            _, missed, complete = first.subscribe(last_event_id=42)
+            self.assertEqual(([event.id for event in missed], complete), ([43], True))
+            # El segundo worker arrancó después del evento 42: no puede reanudar desde 41
+            _, _, complete = second.subscribe(last_event_id=41)
+            self.assertFalse(complete)
+        asyncio.run(scenario())
+
+    def test_create_and_status_change_publish_events(self):
+        last_id = hub.last_id
+        with self.captureOnCommitCallbacks(execute=True):
+            response = APIClient().post('/api/orders/', order_payload(self.products), format='json')
+        order_id = response.json()['id']
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.patch(f'/api/orders/{order_id}/update_status/', {'status': 'preparing'}, format='json')
+
+        events = hub.history(after=last_id)
+        self.assertEqual([event.type for event in events], ['order.created', 'order.status_changed'])
+        self.assertEqual(events[0].data['order'], response.json())
+        self.assertEqual(events[1].data['previous_status'], 'pending')
+        self.assertEqual(events[1].data['order']['status'], 'preparing')
+
+    async def test_stream_requires_staff(self):
+        response = await AsyncClient().get('/api/orders/stream/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stream_replays_missed_events(self):
+        broker = get_broker()
+        broker.publish('order.created', {'order': {'id': 0}})
+        last_id = hub.last_id
+        broker.publish('order.created', {'order': {'id': 1}})
+        response = await AsyncClient().get(
+            '/api/orders/stream/', {'token': self.token.key}, headers={'Last-Event-ID': str(last_id)}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = response.streaming_content
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+        replayed = (await anext(chunks)).decode()
+        self.assertIn(f'id: {last_id + 1}\nevent: order.created\n', replayed)
+        live = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0)
+        broker.publish('order.status_changed', {'order': {'id': 1}})
+        data = (await asyncio.wait_for(live, 1)).decode().split('data: ')[1]
+        self.assertEqual(json.loads(data), {'order': {'id': 1}})
+        await chunks.aclose()
+
+
+@override_settings(ORDER_CHANGES_SETTLE_SECONDS=0)
+class OrderChangesTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        self.products = create_catalog(products_per_category=1, categories=1)
+        for _ in range(3):
+            APIClient().post('/api/orders/', order_payload(self.products), format='json')
+
+    def changes(self, **params):
+        response = self.client.get('/api/orders/changes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_returns_only_orders_changed_after_watermark(self):
+        first = self.changes()
+        self.assertEqual(len(first['results']), 3)
+        self.assertFalse(first['has_more'])
+        # Sin cambios: una sola consulta sobre el índice (updated_at, id)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.changes(since=first['watermark'])['results'], [])
+
+        order = Order.objects.order_by('id').first()
+        self.client.patch(f'/api/orders/{order.id}/update_status/', {'status': 'confirmed'}, format='json')
+        delta = self.changes(since=first['watermark'])
+        self.assertEqual([row['id'] for row in delta['results']], [order.id])
+        self.assertEqual(delta['results'][0]['status'], 'confirmed')
+        self.assertEqual(self.changes(since=delta['watermark'])['results'], [])
+
+    def test_pages_in_update_order(self):
+        page = self.changes(page_size=2)
+        self.assertTrue(page['has_more'])
+        rest = self.changes(since=page['watermark'], page_size=2)
+        self.assertFalse(rest['has_more'])
+        ids = [row['id'] for row in page['results'] + rest['results']]
+        self.assertEqual(ids, list(Order.objects.order_by('updated_at', 'id').values_list('id', flat=True)))
+
+    def test_watermark_stays_behind_unsettled_changes(self):
+        with override_settings(ORDER_CHANGES_SETTLE_SECONDS=60):
+            first = self.changes()
+            self.assertEqual(len(self.changes(since=first['watermark'])['results']), 3)
+
+    def test_paging_stops_at_the_settle_boundary(self):
+        with override_settings(ORDER_CHANGES_SETTLE_SECONDS=60):
+            page = self.changes(page_size=2)
+            self.assertFalse(page['has_more'])
+            # La marca no avanzó hasta la última fila de la página
+            self.assertEqual(len(self.changes(since=page['watermark'], page_size=5)['results']), 3)
+
+    def test_invalid_watermark(self):
+        response = self.client.get('/api/orders/changes/', {'since': 'nope'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('since', response.json())
+
+
+class OrderStatusTransitionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        products = create_catalog(products_per_category=1, categories=1)
+        self.order_id = APIClient().post('/api/orders/', order_payload(products), format='json').json()['id']
+
+    def set_status(self, new_status, **extra):
+        return self.client.patch(
+            f'/api/orders/{self.order_id}/update_status/', {'status': new_status, **extra}, format='json'
+        )
+
+    def test_transition_is_one_conditional_update(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.set_status('confirmed', expected_status='pending')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'confirmed')
+        writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(writes), 1)
+        self.assertIn('"status" = \'pending\'', writes[0])
+        self.assertNotIn('customer_name', writes[0])
+
+    def test_stale_expected_status_conflicts(self):
+        self.assertEqual(self.set_status('confirmed', expected_status='pending').status_code, 200)
+        # Un segundo cocinero con la vista anterior no pisa el cambio
+        response = self.set_status('cancelled', expected_status='pending')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['status'], 'confirmed')
+        self.assertEqual(Order.objects.get().status, 'confirmed')
+
+    def test_illegal_transition_conflicts(self):
+        for new_status in ('confirmed', 'preparing', 'ready', 'delivered'):
+            self.assertEqual(self.set_status(new_status).status_code, 200)
+        response = self.set_status('pending')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['allowed'], [])
+        self.assertEqual(self.set_status('unknown').status_code, 400)
+
+    def test_full_update_rejects_illegal_transition(self):
+        data = self.client.get(f'/api/orders/{self.order_id}/').json()
+        data['status'] = 'delivered'
+        response = self.client.put(f'/api/orders/{self.order_id}/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status', response.json())
+
+    def stale_edit(self, method, data):
+        """Editar con el pedido leído antes de que otro usuario lo pasara a 'confirmed'"""
+        stale = Order.objects.get(pk=self.order_id)
+        self.set_status('confirmed')
+        with mock.patch.object(OrderViewSet, 'get_object', return_value=stale):
+            return getattr(self.client, method)(f'/api/orders/{self.order_id}/', data, format='json')
+
+    def test_partial_update_does_not_revert_concurrent_status(self):
+        response = self.stale_edit('patch', {'notes': 'Sin cebolla'})
+        self.assertEqual(response.status_code, 200, response.content)
+        order = Order.objects.get(pk=self.order_id)
+        self.assertEqual((order.status, order.notes), ('confirmed', 'Sin cebolla'))
+
+    def test_status_change_in_update_uses_loaded_status(self):
+        response = self.stale_edit('patch', {'notes': 'Cancelar', 'status': 'cancelled'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['status'], 'confirmed')
+        order = Order.objects.get(pk=self.order_id)
+        self.assertEqual((order.status, order.notes), ('confirmed', None))
+
+
+class BulkOrderStatusTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        products = create_catalog(products_per_category=1, categories=1)
+        for _ in range(4):
+            APIClient().post('/api/orders/', order_payload(products), format='json')
+        self.orders = list(Order.objects.order_by('id'))
+
+    def test_applies_allowed_transitions_in_one_update(self):
+        first, second, third, _ = self.orders
+        Order.objects.filter(pk=third.pk).update(status='delivered')
+        payload = {
+            'status': 'cancelled',
+            'ids': [first.id, third.id, 999999],
+            'order_numbers': [second.order_number, first.order_number],
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/orders/bulk_status/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "api_order"')]), 1)
+
+        data = response.json()
+        self.assertEqual(data['updated'], 2)
+        results = {result.get('id', result.get('order_number')): result for result in data['results']}
+        self.assertEqual(results[first.id]['result'], 'updated')
+        self.assertEqual(results[second.id]['previous_status'], 'pending')
+        self.assertEqual(results[third.id], {
+            'id': third.id, 'order_number': third.order_number, 'result': 'conflict', 'status': 'delivered'
+        })
+        self.assertEqual(results[999999]['result'], 'not_found')
+        self.assertEqual(
+            dict(Order.objects.values_list('id', 'status')),
+            {first.id: 'cancelled', second.id: 'cancelled', third.id: 'delivered', self.orders[3].id: 'pending'}
+        )
+
+    def test_one_update_per_source_status(self):
+        first, second, _, fourth = self.orders
+        Order.objects.filter(pk__in=[second.pk, fourth.pk]).update(status='confirmed')
+        payload = {'status': 'cancelled', 'ids': [first.id, second.id, fourth.id]}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/orders/bulk_status/', payload, format='json')
+        writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "api_order"')]
+        self.assertEqual(len(writes), 2)
+        self.assertTrue(all('"status" IN' not in sql for sql in writes))
+        previous = {result['id']: result['previous_status'] for result in response.json()['results']}
+        self.assertEqual(previous, {first.id: 'pending', second.id: 'confirmed', fourth.id: 'confirmed'})
+
+    def test_requires_orders_and_valid_status(self):
+        self.assertEqual(self.client.post('/api/orders/bulk_status/', {'status': 'ready'}, format='json').status_code, 400)
+        response = self.client.post('/api/orders/bulk_status/', {'status': 'nope', 'ids': [1]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_action_uses_bulk_path(self):
+        self.client.force_login(self.admin)
+        response = self.client.post('/admin/api/order/', {
+            'action': 'mark_confirmed',
+            '_selected_action': [order.pk for order in self.orders[:2]],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Order.objects.filter(status='confirmed').count(), 2)
+
+
+class OrderStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        products = create_catalog(products_per_category=1, categories=1)
+        for _ in range(3):
+            APIClient().post('/api/orders/', order_payload(products), format='json')
+        # Un pedido de ayer y uno cancelado hoy
+        yesterday = Order.objects.order_by('id').first()
+        Order.objects.filter(pk=yesterday.pk).update(created_at=timezone.now() - timedelta(days=1))
+        Order.objects.filter(pk=Order.objects.order_by('id').last().pk).update(status='cancelled')
+
+    def test_stats_are_aggregated_and_cached(self):
+        with self.assertNumQueries(2):
+            data = self.client.get('/api/orders/stats/').json()
+        self.assertEqual(data['total_orders'], 3)
+        self.assertEqual(data['by_status']['pending'], 2)
+        self.assertEqual(data['by_status']['cancelled'], 1)
+        self.assertEqual(data['by_status']['delivered'], 0)
+        total = Order.objects.order_by('id')[1].total_amount
+        self.assertEqual(data['today'], {'orders': 2, 'revenue': float(total), 'average_ticket': float(total)})
+        self.assertEqual(sum(hour['orders'] for hour in data['orders_per_hour']), 2)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/orders/stats/').json(), data)
+
+    def test_stats_require_admin(self):
+        self.assertEqual(APIClient().get('/api/orders/stats/').status_code, 401)
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        self.products = create_catalog(products_per_category=2, categories=1)
+        self.extra = self.products[0].product_ingredients.filter(default_included=False).first()
+        for _ in range(3):
+            payload = order_payload(self.products, extras={str(self.extra.ingredient_id): '2'}, quantity='3')
+            APIClient().post('/api/orders/', payload, format='json')
+        self.today = timezone.localdate()
+
+    def rollups(self):
+        products = {
+            row.product_id: (row.quantity, row.revenue, row.orders)
+            for row in DailyProductSales.objects.filter(day=self.today)
+        }
+        extras = {
+            row.ingredient_id: (row.quantity, row.revenue, row.orders)
+            for row in DailyExtraSales.objects.filter(day=self.today)
+        }
+        return products, extras
+
+    def test_create_and_cancel_update_rollups(self):
+        products, extras = self.rollups()
+        first_line = OrderItem.objects.filter(product=self.products[0]).first()
+        self.assertEqual(products[self.products[0].id], (9, first_line.total_price * 3, 3))
+        # El extra va en ambos productos: 2 por unidad, 3 unidades, 2 líneas, 3 pedidos
+        self.assertEqual(extras[self.extra.ingredient_id], (36, self.extra.extra_cost * 36, 3))
+
+        order = Order.objects.order_by('id').first()
+        self.client.patch(f'/api/orders/{order.id}/update_status/', {'status': 'cancelled'}, format='json')
+        self.client.post('/api/orders/bulk_status/', {'status': 'cancelled', 'ids': [order.id]}, format='json')
+        products, extras = self.rollups()
+        self.assertEqual(products[self.products[0].id], (6, first_line.total_price * 2, 2))
+        self.assertEqual(extras[self.extra.ingredient_id], (24, self.extra.extra_cost * 24, 2))
+
+    def test_rebuild_matches_incremental_rollups(self):
+        Order.objects.filter(pk=Order.objects.order_by('id').last().pk).update(status='cancelled')
+        incremental = self.rollups()
+        DailyProductSales.objects.update(quantity=0)
+        call_command('rebuild_sales_rollups', '--from', self.today.isoformat(), '--to', self.today.isoformat(), stdout=StringIO())
+        products, extras = self.rollups()
+        # El pedido cancelado por fuera de la API solo desaparece al recalcular
+        self.assertEqual(products[self.products[0].id][0], incremental[0][self.products[0].id][0] - 3)
+        self.assertEqual(extras[self.extra.ingredient_id][2], 2)
+
+    def test_racing_cancel_is_subtracted_once(self):
+        order = Order.objects.order_by('id').first()
+        stale = Order.objects.get(pk=order.pk)
+        self.client.patch(f'/api/orders/{order.id}/update_status/', {'status': 'cancelled'}, format='json')
+        after_cancel = self.rollups()
+        # Un PUT con el pedido leído antes de la cancelación no vuelve a descontarlo
+        data = self.client.get(f'/api/orders/{order.id}/').json()
+        data['status'] = 'cancelled'
+        with mock.patch.object(OrderViewSet, 'get_object', return_value=stale):
+            response = self.client.put(f'/api/orders/{order.id}/', data, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.rollups(), after_cancel)
+        self.assertEqual(after_cancel[0][self.products[0].id][2], 2)
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        self.products = create_catalog(products_per_category=2, categories=1)
+        self.extra = self.products[0].product_ingredients.filter(default_included=False).first()
+        for _ in range(3):
+            payload = order_payload(self.products, extras={str(self.extra.ingredient_id): '1'})
+            APIClient().post('/api/orders/', payload, format='json')
+
+    def export(self, **params):
+        response = self.client.get('/api/orders/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_has_one_line_per_item(self):
+        response, content = self.export(format='csv')
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(len(rows), OrderItem.objects.count())
+        self.assertEqual(rows[0]['order_number'], Order.objects.order_by('id').first().order_number)
+        self.assertIn(f"{self.extra.ingredient.name} x1", rows[0]['extras'])
+
+    def test_csv_neutralises_formulas_in_customer_fields(self):
+        Order.objects.update(customer_name='=HYPERLINK("http://x")', customer_phone='+56911111111')
+        _, content = self.export(format='csv')
+        row = next(csv.DictReader(StringIO(content)))
+        self.assertEqual(row['customer_name'], '\'=HYPERLINK("http://x")')
+        self.assertEqual(row['customer_phone'], "'+56911111111")
+        self.assertEqual(row['customer_email'], 'ana@example.com')
+        # NDJSON no lo abre una planilla: los datos van tal cual
+        _, content = self.export(format='ndjson')
+        self.assertEqual(json.loads(content.splitlines()[0])['customer_name'], '=HYPERLINK("http://x")')
+
+    def test_ndjson_is_read_in_chunks(self):
+        with mock.patch('api.export.EXPORT_CHUNK_SIZE', 2):
+            with CaptureQueriesContext(connection) as ctx:
+                _, content = self.export(format='ndjson')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['item_id'] for row in rows], list(OrderItem.objects.order_by('id').values_list('id', flat=True)))
+        self.assertEqual(rows[0]['extras'][0]['quantity'], 1)
+        # 6 items en lotes de 2: 3 lotes con items y extras, más la consulta final vacía
+        self.assertEqual(len([q for q in ctx.captured_queries if 'api_orderitem' in q['sql']]), 7)
+
+    def test_date_range_and_format_validation(self):
+        Order.objects.filter(pk=Order.objects.order_by('id').first().pk).update(
+            created_at=timezone.now() - timedelta(days=3)
+        )
+        since = (timezone.localdate() - timedelta(days=1)).isoformat()
+        _, content = self.export(format='ndjson', **{'from': since})
+        self.assertEqual(len(content.splitlines()), 4)
+        _, content = self.export(format='csv', to='2000-01-01')
+        self.assertEqual(content.splitlines(), [','.join(CSV_COLUMNS)])
+        response = self.client.get('/api/orders/export/', {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('format', response.json())
+
+
+class CategoryCounterTests(TestCase):
+    def setUp(self):
+        self.first, self.second = Category.objects.create(name='A'), Category.objects.create(name='B')
+
+    def counts(self):
+        return list(Category.objects.order_by('id').values_list('active_products_count', flat=True))
+
+    def test_counter_follows_product_changes(self):
+        product = Product.objects.create(name='P', description='d', price=Decimal('1.00'), category=self.first)
+        Product.objects.create(name='Q', description='d', price=Decimal('1.00'), category=self.first)
+        self.assertEqual(self.counts(), [2, 0])
+
+        product = Product.objects.get(pk=product.pk)
+        product.category = self.second
+        product.save()
+        self.assertEqual(self.counts(), [1, 1])
+
+        product.is_active = False
+        product.save()
+        self.assertEqual(self.counts(), [1, 0])
+        product.save()
+        self.assertEqual(self.counts(), [1, 0])
+
+        Product.objects.filter(category=self.first).delete()
+        product.delete()
+        self.assertEqual(self.counts(), [0, 0])
+
+    def test_stale_instance_uses_stored_row(self):
+        products = [
+            Product.objects.create(name=f'P{i}', description='d', price=Decimal('1.00'), category=self.first)
+            for i in range(3)
+        ]
+        product = Product.objects.get(pk=products[0].pk)
+        other = Product.objects.get(pk=products[0].pk)
+        other.is_active = False
+        other.save()
+        self.assertEqual(self.counts(), [2, 0])
+
+        product.refresh_from_db()
+        product.save()
+        self.assertEqual(self.counts(), [2, 0])
+
+        # Dos admins cargaron el producto activo y ambos lo desactivan
+        first_admin = Product.objects.get(pk=products[1].pk)
+        second_admin = Product.objects.get(pk=products[1].pk)
+        for admin_copy in (first_admin, second_admin):
+            admin_copy.is_active = False
+            admin_copy.save()
+        self.assertEqual(self.counts(), [1, 0])
+
+        # Un guardado parcial con la copia vieja no reactiva el contador
+        second_admin.is_active = True
+        second_admin.save(update_fields=['name'])
+        self.assertEqual(self.counts(), [1, 0])
+        second_admin.save(update_fields=['is_active'])
+        self.assertEqual(self.counts(), [2, 0])
+
+    def test_drifted_counter_does_not_block_delete(self):
+        # bulk_create no cuenta el producto: el contador queda en 0
+        product = Product.objects.bulk_create([
+            Product(name='P', description='d', price=Decimal('1.00'), category=self.first)
+        ])[0]
+        Product.objects.get(pk=product.pk).delete()
+        self.assertEqual(self.counts(), [0, 0])
+        Product.objects.bulk_create([Product(name='Q', description='d', price=Decimal('1.00'), category=self.first)])
+        Product.objects.filter(category=self.first).delete()
+        self.assertEqual(self.counts(), [0, 0])
+
+    def test_categories_endpoint_is_one_query(self):
+        create_catalog(products_per_category=3, categories=2)
+        with self.assertNumQueries(1):
+            data = APIClient().get('/api/categories/').json()
+        self.assertEqual(sorted(c['products_count'] for c in data), [0, 0, 3, 3])
+
+    def test_reconcile_fixes_drift(self):
+        Product.objects.bulk_create([
+            Product(name=f'P{i}', description='d', price=Decimal('1.00'), category=self.second) for i in range(3)
+        ])
+        Category.objects.filter(pk=self.first.pk).update(active_products_count=5)
+        out = StringIO()
+        call_command('reconcile_category_counts', stdout=out)
+        self.assertEqual(self.counts(), [0, 3])
+        self.assertIn('Categorías corregidas: 2', out.getvalue())
+
+
+class ProductWriteTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        self.product = create_catalog(products_per_category=1, categories=1, ingredients_per_product=3)[0]
+        self.ingredients = list(Ingredient.objects.order_by('id'))
+
+    def form(self, tags, ingredients):
+        data = {
+            'name': self.product.name, 'description': 'Nueva', 'price': '12.00',
+            'category': self.product.category_id, 'is_active': 'true',
+            'product_ingredients': json.dumps(ingredients),
+        }
+        data.update({f'tag_names[{i}]': tag for i, tag in enumerate(tags)})
+        return data
+
+    def current_ingredients(self):
+        return [
+            {'ingredient_id': pi.ingredient_id, 'default_included': pi.default_included,
+             'extra_cost': str(pi.extra_cost), 'is_active': pi.is_active}
+            for pi in self.product.product_ingredients.order_by('ingredient_id')
+        ]
+
+    def test_update_only_touches_changed_rows(self):
+        tag_ids = dict(self.product.tags.values_list('name', 'id'))
+        links = dict(self.product.product_ingredients.values_list('ingredient_id', 'id'))
+
+        ingredients = self.current_ingredients()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.put(
+                f'/api/products/{self.product.id}/', self.form(['Popular', 'Nuevo'], ingredients), format='multipart'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        churn = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith(('INSERT', 'DELETE', 'UPDATE "products_productingredient"'))
+        ]
+        self.assertEqual(churn, [])
+
+        ingredients[0]['extra_cost'] = '2.50'
+        ingredients.pop()
+        ingredients.append({'ingredient_id': Ingredient.objects.create(name='Palta').id})
+        response = self.client.put(
+            f'/api/products/{self.product.id}/', self.form(['Popular', 'Picante', 'Picante'], ingredients),
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(sorted(tag['name'] for tag in response.json()['tags']), ['Picante', 'Popular'])
+        self.assertEqual(self.product.tags.get(name='Popular').id, tag_ids['Popular'])
+        first = self.product.product_ingredients.get(ingredient=self.ingredients[0])
+        self.assertEqual((first.id, first.extra_cost), (links[self.ingredients[0].id], Decimal('2.50')))
+        self.assertFalse(self.product.product_ingredients.filter(ingredient=self.ingredients[2]).exists())
+        self.assertEqual(self.product.product_ingredients.count(), 3)
+
+    def test_invalid_ingredients_reject_whole_update(self):
+        for payload in ('{no json', json.dumps([{'ingredient_id': 999999}])):
+            data = self.form(['Otro'], [])
+            data['product_ingredients'] = payload
+            response = self.client.put(f'/api/products/{self.product.id}/', data, format='multipart')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('product_ingredients', response.json())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.description, 'Producto de prueba')
+        self.assertEqual(self.product.tags.count(), 2)
+
+    def test_create_with_tags_and_ingredients(self):
+        data = self.form(['Nuevo'], [{'ingredient_id': self.ingredients[0].id, 'extra_cost': 1}])
+        data['name'] = 'Otro producto'
+        response = self.client.post('/api/products/', data, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+        product = Product.objects.get(name='Otro producto')
+        self.assertEqual(list(product.tags.values_list('name', flat=True)), ['Nuevo'])
+        self.assertEqual(product.product_ingredients.get().extra_cost, Decimal('1.00'))
+
+
+class CatalogImportExportTests(TestCase):
+    def setUp(self):
+        create_catalog(products_per_category=2, categories=2, ingredients_per_product=2)
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def export(self, export_format):
+        path = os.path.join(self.dir.name, f'catalogo.{export_format}')
+        call_command('catalog_export', format=export_format, output=path, stdout=StringIO())
+        with open(path, encoding='utf-8') as stream:
+            return path, stream.read()
+
+    def test_roundtrip_rebuilds_catalog(self):
+        for export_format in ('json', 'csv'):
+            path, before = self.export(export_format)
+            Product.objects.all().delete()
+            Ingredient.objects.all().delete()
+            Category.objects.all().delete()
+            call_command('catalog_import', path, stdout=StringIO())
+            self.assertEqual(self.export(export_format)[1], before)
+            self.assertEqual(
+                list(Category.objects.values_list('active_products_count', flat=True)), [2, 2]
+            )
+
+    def test_reimport_writes_nothing(self):
+        for export_format in ('json', 'csv'):
+            path = self.export(export_format)[0]
+            with CaptureQueriesContext(connection) as ctx:
+                call_command('catalog_import', path, stdout=StringIO())
+            writes = [
+                q['sql'] for q in ctx.captured_queries
+                if q['sql'].startswith(('INSERT', 'DELETE')) or q['sql'].startswith('UPDATE "products_product"')
+            ]
+            self.assertEqual(writes, [])
+
+    def test_import_upserts_on_natural_keys(self):
+        path = os.path.join(self.dir.name, 'cambios.json')
+        with open(path, 'w', encoding='utf-8') as stream:
+            json.dump({'products': [
+                {'category': 'Categoría 0', 'name': 'Producto 0-0', 'description': 'Otra', 'price': '12.5',
+                 'tags': ['Popular', 'Picante'], 'ingredients': [{'name': 'Palta', 'extra_cost': '2'}]},
+                {'category': 'Bebidas', 'name': 'Agua', 'price': '2', 'is_active': 'false'},
+            ]}, stream)
+        call_command('catalog_import', path, stdout=StringIO())
+
+        product = Product.objects.get(category__name='Categoría 0', name='Producto 0-0')
+        self.assertEqual((product.description, product.price), ('Otra', Decimal('12.50')))
+        self.assertEqual(sorted(product.tags.values_list('name', flat=True)), ['Picante', 'Popular'])
+        self.assertEqual(
+            list(product.product_ingredients.values_list('ingredient__name', 'extra_cost')),
+            [('Palta', Decimal('2.00'))]
+        )
+        self.assertEqual(Product.objects.count(), 5)
+        self.assertEqual(Category.objects.get(name='Bebidas').active_products_count, 0)
+        # Los productos que no vienen en el archivo no se tocan
+        self.assertEqual(Product.objects.get(name='Producto 0-1').tags.count(), 2)
+
+    def test_name_lookups_are_batched(self):
+        path = os.path.join(self.dir.name, 'lotes.json')
+        with open(path, 'w', encoding='utf-8') as stream:
+            json.dump({'ingredients': [{'name': f'Extra {i}'} for i in range(5)]}, stream)
+        with mock.patch('api.catalog_io.BATCH_SIZE', 2), CaptureQueriesContext(connection) as ctx:
+            call_command('catalog_import', path, stdout=StringIO())
+        lookups = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('SELECT') and 'FROM "products_ingredient" WHERE "products_ingredient"."name" IN' in q['sql']
+        ]
+        # 5 nombres en lotes de 2, antes y después de crearlos
+        self.assertEqual(len(lookups), 6)
+        self.assertTrue(all(sql.count("'Extra") <= 2 for sql in lookups))
+        self.assertEqual(Ingredient.objects.filter(name__startswith='Extra').count(), 5)
+
+    def test_invalid_file_rolls_back(self):
+        path = os.path.join(self.dir.name, 'malo.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as stream:
+            writer = csv.writer(stream)
+            writer.writerow(CATALOG_CSV_COLUMNS)
+            writer.writerow(['Nueva', '', 'Uno', '', '5', '1', '', '', '', '', ''])
+            writer.writerow(['Nueva', '', 'Dos', '', 'gratis', '1', '', '', '', '', ''])
+        with self.assertRaises(CommandError):
+            call_command('catalog_import', path, stdout=StringIO())
+        self.assertFalse(Category.objects.filter(name='Nueva').exists())
+
+
+class PriceAdjustmentTests(TestCase):
+    url = '/api/products/adjust_prices/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        self.products = create_catalog(products_per_category=2, categories=2, ingredients_per_product=2)
+        Product.objects.filter(pk=self.products[0].pk).update(price=Decimal('18.99'))
+
+    def prices(self):
+        return list(Product.objects.order_by('id').values_list('price', flat=True))
+
+    def test_dry_run_previews_without_writing(self):
+        payload = {'mode': 'percent', 'value': '5', 'category': 'Categoría 0', 'dry_run': True}
+        with self.assertNumQueries(2):  # conteo y vista previa
+            response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([(c['old'], c['new']) for c in data['changes']], [(18.99, 19.94), (10.0, 10.5)])
+        self.assertEqual(self.prices()[0], Decimal('18.99'))
+
+    def test_apply_is_one_update_and_invalidates_once(self):
+        payload = {'mode': 'percent', 'value': '5', 'category': 'Categoría 0'}
+        with mock.patch('api.price_adjust.invalidate') as invalidate, \
+                CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.json(), {'dry_run': False, 'count': 2})
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(invalidate.call_count, 2)  # menú y tabla de precios
+        self.assertEqual(self.prices(), [Decimal('19.94'), Decimal('10.50'), Decimal('10.00'), Decimal('10.00')])
+
+        response = self.client.post(self.url, {'mode': 'amount', 'value': '-20', 'tag': 'Nuevo', 'ids': [self.products[3].id]}, format='json')
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(self.prices()[3], Decimal('0.00'))
+
+    def test_adjusts_extra_cost_by_ingredient(self):
+        ingredient = Ingredient.objects.order_by('id').first()
+        url = f'/api/products/{self.products[0].id}/calculate_price/'
+        self.client.post(url, {'extra_ids': [ingredient.id]}, format='json')
+        response = self.client.post(
+            self.url, {'target': 'extras', 'mode': 'amount', 'value': '0.50', 'ingredient': ingredient.id}, format='json'
+        )
+        self.assertEqual(response.json()['count'], 4)
+        self.assertEqual(
+            set(ProductIngredient.objects.filter(ingredient=ingredient).values_list('extra_cost', flat=True)),
+            {Decimal('2.00')}
+        )
+        self.assertEqual(self.client.post(url, {'extra_ids': [ingredient.id]}, format='json').json()['extras_total'], 2.0)
+
+    def test_requires_admin_and_filters(self):
+        response = self.client.post(self.url, {'mode': 'percent', 'value': '5'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url, {'target': 'extras', 'mode': 'percent', 'value': '5'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = APIClient().post(self.url, {'mode': 'percent', 'value': '5', 'ids': [1]}, format='json')
+        self.assertIn(response.status_code, (401, 403))
+        self.assertEqual(self.prices()[1:], [Decimal('10.00')] * 3)
+
+
+class SqliteProductionProfileTests(TestCase):
+    def connect(self, **options):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        handler = ConnectionHandler({'default': {
+            'ENGINE': 'fastfood.sqlite', 'NAME': os.path.join(directory.name, 'db.sqlite3'), 'OPTIONS': options,
+        }})
+        self.addCleanup(handler.close_all)
+        return handler['default']
+
+    def test_init_command_and_immediate_transactions(self):
+        conn = self.connect(
+            timeout=20, transaction_mode='IMMEDIATE',
+            init_command='PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA cache_size=-65536',
+        )
+        with conn.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -65536)
+
+        # BEGIN IMMEDIATE toma el lock de escritura antes de la primera consulta
+        conn._start_transaction_under_autocommit()
+        self.addCleanup(conn.connection.rollback)
+        other = sqlite3.connect(conn.settings_dict['NAME'], timeout=0)
+        self.addCleanup(other.close)
+        with self.assertRaisesRegex(sqlite3.OperationalError, 'locked'):
+            other.execute('BEGIN IMMEDIATE')
+
+    def test_invalid_transaction_mode(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.connect(transaction_mode='LAZY').ensure_connection()
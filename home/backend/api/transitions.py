@@ -0,0 +1,82 @@
+"""Cambios de estado de pedidos (API y acciones del admin).
+
+En ``bulk_transition`` se leen los pedidos en una consulta, se descartan los
+que no pueden pasar al estado destino y el resto se actualiza con un único
+``UPDATE ... WHERE id IN (...) AND status IN (<estados de origen permitidos>)``. Si otro usuario cambió
+alguno entre medio, el UPDATE no lo toca y se informa como conflicto.
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .events import publish_order_event
+from .models import Order
+from .rollups import remove_orders
+from .serializers import ORDER_ROW_FIELDS, serialize_order_rows
+
+
+def allowed_sources(new_status):
+    """Estados desde los que se puede pasar a ``new_status``"""
+    return [current for current, targets in Order.STATUS_TRANSITIONS.items() if new_status in targets]
+
+
+@transaction.atomic
+def transition(pk, expected, new_status):
+    """Transición compare-and-set de un pedido; al cancelar se descuenta de las ventas diarias"""
+    applied = Order.transition_status(pk, expected, new_status)
+    if applied and new_status == 'cancelled':
+        remove_orders([pk])
+    return applied
+
+
+@transaction.atomic
+def bulk_transition(new_status, ids=(), order_numbers=()):
+    """Aplicar ``new_status`` a los pedidos indicados; devuelve un resultado por pedido"""
+    ids, order_numbers = list(ids), list(order_numbers)
+    rows = Order.objects.filter(Q(pk__in=ids) | Q(order_number__in=order_numbers)).values_list(
+        'id', 'order_number', 'status'
+    )
+    sources = allowed_sources(new_status)
+    found = {pk: (number, current) for pk, number, current in rows}
+    # Un UPDATE por estado leído: cada uno solo aplica si el pedido sigue en ese
+    # estado, así que ``previous_status`` es exactamente el que se reemplazó
+    by_status = {}
+    for pk, (_, current) in found.items():
+        if current in sources:
+            by_status.setdefault(current, []).append(pk)
+
+    applied = set()
+    if by_status:
+        now = timezone.now()
+        for current, group in by_status.items():
+            updated = Order.objects.filter(pk__in=group, status=current).update(
+                status=new_status, updated_at=now
+            )
+            if updated == len(group):
+                applied.update(group)
+            else:
+                # Alguno cambió entre la lectura y el UPDATE: ver cuáles se aplicaron
+                applied.update(Order.objects.filter(
+                    pk__in=group, status=new_status, updated_at=now
+                ).values_list('id', flat=True))
+        if applied and new_status == 'cancelled':
+            remove_orders(list(applied))
+
+    results = []
+    for pk, (number, current) in found.items():
+        if pk in applied:
+            results.append({'id': pk, 'order_number': number, 'result': 'updated', 'previous_status': current})
+        else:
+            results.append({'id': pk, 'order_number': number, 'result': 'conflict', 'status': current})
+    found_numbers = {number for number, _ in found.values()}
+    results += [{'id': pk, 'result': 'not_found'} for pk in ids if pk not in found]
+    results += [
+        {'order_number': number, 'result': 'not_found'}
+        for number in order_numbers if number not in found_numbers
+    ]
+
+    if applied:
+        previous = {pk: found[pk][1] for pk in applied}
+        for data in serialize_order_rows(Order.objects.filter(pk__in=applied).values(*ORDER_ROW_FIELDS)):
+            publish_order_event('order.status_changed', {'order': data, 'previous_status': previous[data['id']]})
+    return results
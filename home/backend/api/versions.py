@@ -0,0 +1,33 @@
+"""Versiones de los datos que cada proceso guarda en memoria.
+
+Viven en la tabla ``DataVersion`` y no en el cache: así todos los workers ven
+el mismo número (y el mismo ETag), y un incremento dentro de una transacción
+solo se hace visible junto con el cambio que lo provocó.
+"""
+import time
+
+from django.db.models import F
+
+from .models import DataVersion
+
+
+def _initial_version():
+    # Basado en el reloj para no repetir versiones si la fila se borra
+    return time.time_ns() // 1000
+
+
+def get_version(key):
+    """Obtener la versión actual de un dato cacheado"""
+    version = DataVersion.objects.filter(key=key).values_list('value', flat=True).first()
+    if version is None:
+        version = DataVersion.objects.get_or_create(
+            key=key, defaults={'value': _initial_version()}
+        )[0].value
+    return version
+
+
+def bump_version(key):
+    """Incrementar la versión para invalidar todo lo construido con la anterior"""
+    if not DataVersion.objects.filter(key=key).update(value=F('value') + 1):
+        # La fila aún no existía
+        DataVersion.objects.get_or_create(key=key, defaults={'value': _initial_version()})
@@ -1,17 +1,54 @@
+import logging
+from datetime import datetime, time, timedelta
+
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
-from rest_framework.exceptions import ValidationError  # AGREGAR ESTA LÍNEA
-from django.db.models import Q
+from rest_framework.exceptions import ValidationError, NotFound  # AGREGAR ESTA LÍNEA
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.renderers import JSONRenderer
+from django.db import transaction
+from django.db.models import Prefetch
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from products.models import Category, Product, ProductTag, Ingredient, ProductIngredient
 from .models import HeroSection, AboutSection, ContactInfo, FeaturedProduct, Order, OrderItem, OrderItemExtra
 from .serializers import (
     CategorySerializer, ProductSerializer, ProductDetailSerializer, ProductTagSerializer,
     HeroSectionSerializer, AboutSectionSerializer, ContactInfoSerializer, FeaturedProductSerializer,
-    IngredientSerializer, ProductIngredientSerializer, OrderSerializer, CreateOrderSerializer
+    IngredientSerializer, ProductIngredientSerializer, OrderSerializer, CreateOrderSerializer,
+    CartQuoteSerializer, BulkOrderStatusSerializer, PriceAdjustmentSerializer, ORDER_ROW_FIELDS, serialize_order_rows
+)
+from .cart import CartResolver
+from .catalog import (
+    extract_tag_names, parse_product_ingredients, sync_product_tags, sync_product_ingredients
 )
-from decimal import Decimal
+from .events import publish_order_event
+from .export import FORMATS as EXPORT_FORMATS, export_lines, aexport_lines
+from .idempotency import idempotent_response
+from .intake import queue_enabled, enqueue_order
+from .menu import get_menu_snapshot, menu_etag, menu_version
+from .pagination import OrderCursorPagination, OrderChangesPagination
+from .price_adjust import adjust_prices
+from .pricing import get_prices
+from .search import search_products
+from .stats import get_order_stats
+from .transitions import transition, bulk_transition
+
+logger = logging.getLogger(__name__)
+
+def with_catalog_relations(queryset):
+    """Precargar categoría, tags e ingredientes para serializar productos sin N+1"""
+    return queryset.select_related('category').prefetch_related(
+        'tags',
+        Prefetch(
+            'product_ingredients',
+            queryset=ProductIngredient.objects.select_related('ingredient'),
+        ),
+    )
 
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
@@ -28,7 +65,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
     def products(self, request, pk=None):
         """Obtener todos los productos de una categoría específica"""
         category = self.get_object()
-        products = Product.objects.filter(category=category, is_active=True)
+        products = with_catalog_relations(Product.objects.filter(category=category, is_active=True))
         serializer = ProductSerializer(products, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -57,125 +94,65 @@ class ProductViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(category__name=category)
         
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | 
-                Q(description__icontains=search) |
-                Q(category__name__icontains=search)
-            )
+            queryset = search_products(queryset, search)
         
-        return queryset
+        return with_catalog_relations(queryset)
     
-    def create(self, request, *args, **kwargs):
-        # Extraer las etiquetas del request
-        tag_names = []
-        for key in request.data.keys():
-            if key.startswith('tag_names[') and key.endswith(']'):
-                tag_names.append(request.data[key])
-        
-        # Extraer ingredientes si vienen
+    def save_product(self, request, instance=None, partial=False):
+        """Guardar el producto y sincronizar tags e ingredientes en una sola transacción"""
+        tag_names = extract_tag_names(request.data)
         product_ingredients_data = request.data.get('product_ingredients')
         
-        # Crear una copia mutable de los datos
+        # Tags e ingredientes se sincronizan aparte, no con el serializer
         data = request.data.copy()
-        
-        # Remover las etiquetas de los datos principales
         for key in list(data.keys()):
-            if key.startswith('tag_names['):
+            if key.startswith('tag_names') or key == 'product_ingredients':
                 del data[key]
         
-        serializer = self.get_serializer(data=data)
+        serializer = self.get_serializer(instance, data=data, partial=partial)
         serializer.is_valid(raise_exception=True)
-        product = serializer.save()
-        
-        # Crear tags
-        for tag_name in tag_names:
-            if tag_name.strip():
-                ProductTag.objects.create(product=product, name=tag_name.strip())
+        ingredients = None
+        if product_ingredients_data is not None:
+            ingredients = parse_product_ingredients(product_ingredients_data)
         
-        # Crear ingredientes si se enviaron como JSON
-        if product_ingredients_data:
-            # Se espera lista de objetos con ingredient_id, default_included, extra_cost, is_active
-            from json import loads
-            try:
-                parsed = loads(product_ingredients_data) if isinstance(product_ingredients_data, str) else product_ingredients_data
-                for pi in parsed:
-                    ProductIngredient.objects.create(
-                        product=product,
-                        ingredient_id=pi.get('ingredient_id'),
-                        default_included=pi.get('default_included', True),
-                        extra_cost=pi.get('extra_cost', 0),
-                        is_active=pi.get('is_active', True)
-                    )
-            except Exception:
-                pass
+        with transaction.atomic():
+            product = serializer.save()
+            # En un PATCH sin tags se conservan los actuales
+            if tag_names is not None or not partial:
+                sync_product_tags(product, tag_names or [])
+            if ingredients is not None:
+                sync_product_ingredients(product, ingredients)
         
-        response_serializer = ProductDetailSerializer(product, context={'request': request})
-        return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+        # Releer con relaciones: la instancia puede traer tags/ingredientes precargados
+        product = with_catalog_relations(Product.objects.filter(pk=product.pk)).get()
+        return ProductDetailSerializer(product, context={'request': request}).data
+    
+    def create(self, request, *args, **kwargs):
+        return Response(self.save_product(request), status=status.HTTP_201_CREATED)
     
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
-        
-        tag_names = []
-        for key in request.data.keys():
-            if key.startswith('tag_names[') and key.endswith(']'):
-                tag_names.append(request.data[key])
-        
-        product_ingredients_data = request.data.get('product_ingredients')
-        
-        data = request.data.copy()
-        for key in list(data.keys()):
-            if key.startswith('tag_names['):
-                del data[key]
-        
-        serializer = self.get_serializer(instance, data=data, partial=partial)
-        serializer.is_valid(raise_exception=True)
-        product = serializer.save()
-        
-        # Actualizar tags
-        instance.tags.all().delete()
-        for tag_name in tag_names:
-            if tag_name.strip():
-                ProductTag.objects.create(product=product, name=tag_name.strip())
-        
-        # Actualizar ingredientes si se envían
-        if product_ingredients_data is not None:
-            from json import loads
-            try:
-                instance.product_ingredients.all().delete()
-                parsed = loads(product_ingredients_data) if isinstance(product_ingredients_data, str) else product_ingredients_data
-                for pi in parsed:
-                    ProductIngredient.objects.create(
-                        product=product,
-                        ingredient_id=pi.get('ingredient_id'),
-                        default_included=pi.get('default_included', True),
-                        extra_cost=pi.get('extra_cost', 0),
-                        is_active=pi.get('is_active', True)
-                    )
-            except Exception:
-                pass
-        
-        response_serializer = ProductDetailSerializer(product, context={'request': request})
-        return Response(response_serializer.data)
+        return Response(self.save_product(request, instance, partial=partial))
     
     @action(detail=False, methods=['get'])
     def featured(self, request):
         """Obtener productos destacados (los más recientes)"""
-        featured_products = Product.objects.filter(is_active=True).order_by('-created_at')[:6]
+        featured_products = with_catalog_relations(
+            Product.objects.filter(is_active=True).order_by('-created_at')
+        )[:6]
         serializer = self.get_serializer(featured_products, many=True, context={'request': request})
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def search(self, request):
-        """Buscar productos por nombre o descripción"""
+        """Buscar productos por nombre, descripción, categoría o tags (ordenados por relevancia)"""
         search_term = request.query_params.get('q', '')
         if not search_term:
             return Response({'error': 'Término de búsqueda requerido'}, status=status.HTTP_400_BAD_REQUEST)
         
-        products = Product.objects.filter(
-            Q(name__icontains=search_term) | 
-            Q(description__icontains=search_term),
-            is_active=True
+        products = with_catalog_relations(
+            search_products(Product.objects.filter(is_active=True), search_term)
         )
         serializer = self.get_serializer(products, many=True, context={'request': request})
         return Response(serializer.data)
@@ -184,24 +161,65 @@ class ProductViewSet(viewsets.ModelViewSet):
     def calculate_price(self, request, pk=None):
         """Calcular precio para un producto dado un conjunto de extras (IDs de ingredientes)."""
         try:
-            product = self.get_object()
-        except Product.DoesNotExist:
+            product_id = int(pk)
+        except (TypeError, ValueError):
+            return Response({'detail': 'Producto no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+        # Sin consultas a la base de datos: se usa la tabla de precios en memoria
+        price = get_prices([product_id]).get(product_id)
+        if price is None or not price.is_active:
             return Response({'detail': 'Producto no encontrado'}, status=status.HTTP_404_NOT_FOUND)
 
         extra_ids = request.data.get('extra_ids', [])
         if not isinstance(extra_ids, list):
             return Response({'detail': 'extra_ids debe ser una lista de IDs'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            extras = {int(extra_id): 1 for extra_id in extra_ids}
+        except (TypeError, ValueError):
+            return Response({'detail': 'extra_ids debe ser una lista de IDs'}, status=status.HTTP_400_BAD_REQUEST)
 
-        base = Decimal(product.price)
-        extras_qs = product.product_ingredients.filter(default_included=False, is_active=True, ingredient_id__in=extra_ids)
-        extras_total = sum((pi.extra_cost for pi in extras_qs), Decimal('0'))
-        total = base + extras_total
+        # Los IDs que no son extras activos del producto se ignoran
+        extras = {ingredient_id: 1 for ingredient_id in extras if ingredient_id in price.extra_costs}
+        extras_total = price.extras_total(extras)
         return Response({
-            'base_price': base,
+            'base_price': price.base_price,
             'extras_total': extras_total,
-            'total': total,
+            'total': price.base_price + extras_total,
             'extra_ids': extra_ids,
         })
+    
+    @action(detail=False, methods=['post'])
+    def adjust_prices(self, request):
+        """Ajuste masivo (porcentaje o monto) de precios o de un extra; ``dry_run`` solo muestra el resultado"""
+        serializer = PriceAdjustmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(adjust_prices(**serializer.validated_data))
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def menu_view(request):
+    """Menú completo precompilado, con ETag para responder 304 si no cambió"""
+    version = menu_version()
+    etag = menu_etag(version)
+    if_none_match = request.headers.get('If-None-Match', '')
+    client_etags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    if etag in client_etags or '*' in client_etags:
+        # Se compara antes de armar el snapshot: un 304 nunca construye el cuerpo
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(get_menu_snapshot(request, version), content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def cart_quote_view(request):
+    """Cotizar el carrito completo: precios por línea, total y errores en una sola respuesta"""
+    serializer = CartQuoteSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    cart = CartResolver(serializer.validated_data['items']).resolve()
+    return Response(cart.quote())
 
 class ProductTagViewSet(viewsets.ModelViewSet):
     queryset = ProductTag.objects.all()
@@ -307,9 +325,36 @@ class FeaturedProductViewSet(viewsets.ModelViewSet):
         return Response({'error': 'No hay producto destacado activo'}, status=status.HTTP_404_NOT_FOUND)
 
 # VIEWSETS PARA PEDIDOS
+def parse_date_param(name, value, end_of_day=False):
+    """Convertir un parámetro de fecha (YYYY-MM-DD o ISO 8601) en un datetime con zona horaria"""
+    moment = parse_datetime(value)
+    if moment is None:
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValidationError({name: 'Fecha inválida, use YYYY-MM-DD o ISO 8601'})
+        if end_of_day:
+            day += timedelta(days=1)
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+class ExportNegotiation(BaseContentNegotiation):
+    """Ignora ?format= (DRF lo usa para elegir renderer); en el export indica csv o ndjson"""
+    
+    def select_parser(self, request, parsers):
+        return parsers[0] if parsers else None
+    
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
 class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    pagination_class = OrderCursorPagination
     
     def get_permissions(self):
         if self.action == 'create':
@@ -323,59 +368,210 @@ class OrderViewSet(viewsets.ModelViewSet):
             return CreateOrderSerializer
         return OrderSerializer
     
+    def order_data(self, pk):
+        """Pedido serializado desde filas planas (pedido, items y extras en tres consultas)"""
+        return serialize_order_rows(Order.objects.filter(pk=pk).values(*ORDER_ROW_FIELDS))[0]
+    
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset().values(*ORDER_ROW_FIELDS)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(serialize_order_rows(page))
+    
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            pk = int(kwargs['pk'])
+        except ValueError:
+            raise NotFound()
+        rows = serialize_order_rows(self.get_queryset().filter(pk=pk).values(*ORDER_ROW_FIELDS))
+        if not rows:
+            raise NotFound()
+        return Response(rows[0])
+    
+    def status_conflict(self, pk, new_status):
+        """Respuesta 409 con el estado actual y las transiciones permitidas desde él"""
+        current = Order.objects.filter(pk=pk).values_list('status', flat=True).first()
+        if current is None:
+            raise NotFound()
+        return Response(
+            {
+                'error': f'No se puede cambiar el estado de {current} a {new_status}',
+                'status': current,
+                'allowed': Order.STATUS_TRANSITIONS[current],
+            },
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object()
+        loaded_status = instance.status
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        fields = dict(serializer.validated_data)
+        new_status = fields.pop('status', loaded_status)
+        
+        with transaction.atomic():
+            # El estado pasa por el compare-and-set (que descuenta las ventas si cancela)
+            # y el resto se guarda con update_fields: no se pisa un cambio de estado concurrente
+            if new_status != loaded_status and not transition(instance.pk, loaded_status, new_status):
+                return self.status_conflict(instance.pk, new_status)
+            if fields:
+                for field, value in fields.items():
+                    setattr(instance, field, value)
+                instance.save(update_fields=[*fields, 'updated_at'])
+        data = self.order_data(instance.pk)
+        publish_order_event('order.updated', {'order': data})
+        return Response(data)
+    
     def create(self, request, *args, **kwargs):
         """Crear un nuevo pedido"""
-        print("=== DATOS RECIBIDOS EN EL VIEWSET ===")
-        print(f"Request data: {request.data}")
-        
+        # Los reintentos con el mismo Idempotency-Key devuelven la respuesta original
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key:
+            return idempotent_response(request, idempotency_key, lambda: self._create_order(request))
+        return self._create_order(request)
+    
+    def _create_order(self, request):
         serializer = self.get_serializer(data=request.data)
         
         try:
             serializer.is_valid(raise_exception=True)
+            
+            # Modo cola: responder de inmediato y dejar la escritura al worker
+            if queue_enabled():
+                intake = enqueue_order(serializer.validated_data)
+                return Response(
+                    {'order_number': intake.order_number, 'status': 'queued'},
+                    status=status.HTTP_202_ACCEPTED
+                )
+            
             order = serializer.save()
             
-            # Retornar el pedido creado con el serializer de lectura
-            response_serializer = OrderSerializer(order, context={'request': request})
-            return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+            # Retornar el pedido creado con el formato de lectura
+            data = self.order_data(order.pk)
+            publish_order_event('order.created', {'order': data})
+            return Response(data, status=status.HTTP_201_CREATED)
         
-        except ValidationError as e:  # CORREGIDO: usar ValidationError directamente
-            print(f"Error de validación: {e}")
-            print(f"Errores del serializer: {serializer.errors}")
+        except ValidationError:  # CORREGIDO: usar ValidationError directamente
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         except Exception as e:
-            print(f"Error inesperado: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception('order.failed', extra={'fields': {'error': str(e)}})
             return Response(
                 {'error': f'Error interno del servidor: {str(e)}'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """Pedidos creados o modificados desde la marca ``since``, con la nueva marca"""
+        paginator = OrderChangesPagination()
+        page = paginator.paginate_queryset(Order.objects.values(*ORDER_ROW_FIELDS), request, view=self)
+        return paginator.get_paginated_response(serialize_order_rows(page))
+    
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
-        """Actualizar el estado de un pedido"""
-        order = self.get_object()
+        """Actualizar el estado de un pedido (compare-and-set sobre el estado esperado)"""
         new_status = request.data.get('status')
+        choices = dict(Order.STATUS_CHOICES)
         
-        if new_status not in dict(Order.STATUS_CHOICES):
+        if new_status not in choices:
             return Response(
                 {'error': 'Estado inválido'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        order.status = new_status
-        order.save()
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise NotFound()
         
-        serializer = self.get_serializer(order)
-        return Response(serializer.data)
+        # El cliente puede enviar el estado que vio; si no, se usa el actual
+        expected = request.data.get('expected_status')
+        if expected is None:
+            expected = Order.objects.filter(pk=pk).values_list('status', flat=True).first()
+            if expected is None:
+                raise NotFound()
+        elif expected not in choices:
+            return Response(
+                {'error': 'Estado esperado inválido'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not transition(pk, expected, new_status):
+            return self.status_conflict(pk, new_status)
+        
+        data = self.order_data(pk)
+        publish_order_event('order.status_changed', {'order': data, 'previous_status': expected})
+        return Response(data)
+    
+    @action(detail=False, methods=['get'], renderer_classes=[JSONRenderer], content_negotiation_class=ExportNegotiation)
+    def export(self, request):
+        """Descargar pedidos (?format=csv|ndjson&from=&to=) como stream, una línea por item"""
+        export_format = request.query_params.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'format': 'Use csv o ndjson'})
+        orders = Order.objects.all()
+        start = request.query_params.get('from')
+        if start:
+            orders = orders.filter(created_at__gte=parse_date_param('from', start))
+        end = request.query_params.get('to')
+        if end:
+            orders = orders.filter(created_at__lt=parse_date_param('to', end, end_of_day=True))
+        
+        # Bajo ASGI el stream debe ser asíncrono para no acumularse en memoria
+        if isinstance(request._request, ASGIRequest):
+            lines = aexport_lines(orders, export_format)
+        else:
+            lines = export_lines(orders, export_format)
+        response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[export_format][1])
+        filename = f"pedidos-{timezone.localdate():%Y%m%d}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Resumen para el dashboard: pedidos por estado, ingresos de hoy y pedidos por hora"""
+        return Response(get_order_stats())
+    
+    @action(detail=False, methods=['post'])
+    def bulk_status(self, request):
+        """Cambiar el estado de varios pedidos con un solo UPDATE; devuelve el resultado de cada uno"""
+        serializer = BulkOrderStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        results = bulk_transition(data['status'], ids=data['ids'], order_numbers=data['order_numbers'])
+        return Response({
+            'status': data['status'],
+            'updated': sum(1 for result in results if result['result'] == 'updated'),
+            'results': results,
+        })
     
     def get_queryset(self):
-        """Filtrar pedidos por estado si se especifica"""
-        queryset = Order.objects.all().order_by('-created_at')
-        status_filter = self.request.query_params.get('status', None)
+        """Filtrar pedidos por estado, rango de fechas, ciudad o teléfono del cliente"""
+        queryset = Order.objects.all().order_by('-created_at', '-id')
+        params = self.request.query_params
         
+        status_filter = params.get('status', None)
         if status_filter:
             queryset = queryset.filter(status=status_filter)
         
+        created_from = params.get('created_from')
+        if created_from:
+            queryset = queryset.filter(created_at__gte=parse_date_param('created_from', created_from))
+        
+        created_to = params.get('created_to')
+        if created_to:
+            # Una fecha sin hora incluye el día completo
+            end = parse_date_param('created_to', created_to, end_of_day=True)
+            queryset = queryset.filter(created_at__lt=end)
+        
+        city = params.get('city')
+        if city:
+            queryset = queryset.filter(delivery_city=city)
+        
+        phone = params.get('phone')
+        if phone:
+            queryset = queryset.filter(customer_phone=phone)
+        
         return queryset
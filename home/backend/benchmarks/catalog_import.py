@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Tiempo y consultas de catalog_import: primera carga y reimportación sin cambios.
+
+Uso: python benchmarks/catalog_import.py [--products 20000] [--ingredients 4]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from common import setup_django
+
+
+def build_catalog(products, ingredients):
+    names = [f"Ingrediente {i}" for i in range(50)]
+    return {
+        'categories': [{'name': f"Categoría {c}", 'icon': '🍔'} for c in range(20)],
+        'ingredients': [{'name': name, 'is_active': True} for name in names],
+        'products': [
+            {
+                'category': f"Categoría {p % 20}", 'name': f"Producto {p}", 'description': 'Benchmark',
+                'price': f"{5 + p % 20}.90", 'is_active': p % 10 != 0, 'tags': ['Popular', f"Tag {p % 7}"],
+                'ingredients': [
+                    {'name': names[(p + i) % len(names)], 'default_included': i % 2 == 0, 'extra_cost': '1.50'}
+                    for i in range(ingredients)
+                ],
+            }
+            for p in range(products)
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--ingredients', type=int, default=4)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    path = os.path.join(tempfile.mkdtemp(prefix='fastfood-catalog-'), 'catalogo.json')
+    with open(path, 'w', encoding='utf-8') as stream:
+        json.dump(build_catalog(args.products, args.ingredients), stream)
+
+    for label in ('primera carga', 'reimportación'):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            call_command('catalog_import', path, verbosity=0, stdout=open(os.devnull, 'w'))
+            elapsed = time.perf_counter() - start
+        print(f"{label:>14}: {args.products} productos  {len(ctx.captured_queries):>5} consultas  {elapsed:6.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Utilidades compartidas por los benchmarks.
+
+Cada benchmark corre contra una base SQLite temporal con todas las migraciones
+aplicadas, nunca contra ``db.sqlite3``.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(db_options=None, path=None):
+    """Configurar Django con una base de datos temporal (o ``path``, ya migrada) y devolver su ruta"""
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fastfood.settings')
+
+    import django
+    from django.conf import settings
+
+    migrate = path is None
+    if migrate:
+        path = os.path.join(tempfile.mkdtemp(prefix='fastfood-bench-'), 'bench.sqlite3')
+    settings.DATABASES['default']['NAME'] = path
+    if db_options:
+        settings.DATABASES['default']['OPTIONS'] = db_options
+    django.setup()
+
+    if migrate:
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+    return path
+
+
+def timed(fn, repeat):
+    """Ejecutar ``fn`` ``repeat`` veces y devolver las duraciones en milisegundos"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summary(samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return f"p50 {statistics.median(samples):8.2f} ms   p95 {p95:8.2f} ms"
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Memoria y tiempo del export de pedidos (/api/orders/export/) según el volumen.
+
+Uso: python benchmarks/export.py [--orders 1000 10000] [--items 5] [--format csv]
+"""
+import argparse
+import time
+import tracemalloc
+
+from common import setup_django
+from orders import populate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--items', type=int, default=5)
+    parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from api.export import export_lines
+    from api.models import Order, OrderItem
+
+    sizes = sorted(args.orders)
+    populate(sizes[-1], args.items)
+    first_id = Order.objects.order_by('id').values_list('id', flat=True).first()
+
+    for orders in sizes:
+        selection = Order.objects.filter(id__lt=first_id + orders)
+        lines = OrderItem.objects.filter(order__in=selection).count()
+        connection.queries_log.clear()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = 0
+        for block in export_lines(selection, args.format):
+            size += len(block)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(
+            f"{orders:>8} pedidos  {lines:>8} líneas  "
+            f"{size / 2**20:8.1f} MB exportados  pico {peak / 2**20:6.1f} MB  {elapsed:6.2f} s"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Latencia de lectura de pedidos: serializer anidado vs prefetch vs filas planas.
+
+Uso: python benchmarks/orders.py [--orders 1000] [--items 5] [--repeat 5]
+"""
+import argparse
+from decimal import Decimal
+
+from common import setup_django, summary, timed
+
+
+def populate(orders, items_per_order):
+    from products.models import Category, Ingredient, Product
+    from api.models import Order, OrderItem, OrderItemExtra
+
+    category = Category.objects.create(name='Hamburguesas', icon='🍔')
+    ingredient = Ingredient.objects.create(name='Queso')
+    products = Product.objects.bulk_create([
+        Product(name=f'Producto {i}', description='Demo', price=Decimal('9.90'), category=category)
+        for i in range(items_per_order)
+    ])
+    selection = [[ingredient.id, ingredient.name, True, True]]
+    Order.objects.bulk_create([
+        Order(
+            order_number=f'ORD-{i:08d}', customer_name='Cliente', customer_email='c@example.com',
+            customer_phone='+56900000000', delivery_address='Calle 1, Santiago, RM',
+            delivery_street='Calle', delivery_number='1', delivery_city='Santiago',
+            delivery_region='RM', total_amount=Decimal('50.00'),
+        )
+        for i in range(orders)
+    ], batch_size=1000)
+    items = OrderItem.objects.bulk_create([
+        OrderItem(
+            order_id=order_id, product=product, product_name=product.name, quantity=1,
+            unit_price=Decimal('10.90'), total_price=Decimal('10.90'), ingredient_selection=selection,
+        )
+        for order_id in Order.objects.values_list('id', flat=True)
+        for product in products
+    ], batch_size=1000)
+    OrderItemExtra.objects.bulk_create([
+        OrderItemExtra(
+            order_item=item, ingredient=ingredient, ingredient_name=ingredient.name,
+            quantity=1, unit_price=Decimal('1.00'), total_price=Decimal('1.00'),
+        )
+        for item in items
+    ], batch_size=1000)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--items', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection, reset_queries
+    from django.db.models import Prefetch
+    from django.test.utils import CaptureQueriesContext
+    from api.models import Order, OrderItem
+    from api.serializers import ORDER_ROW_FIELDS, OrderSerializer, serialize_order_rows
+
+    populate(args.orders, args.items)
+    print(f"{args.orders} pedidos x {args.items} items (1 extra por item)\n")
+
+    def nested():
+        # Comportamiento anterior: una consulta por pedido y por item
+        OrderSerializer(Order.objects.all(), many=True).data
+
+    def prefetched():
+        queryset = Order.objects.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.prefetch_related('extras'))
+        )
+        OrderSerializer(queryset, many=True).data
+
+    def rows():
+        serialize_order_rows(Order.objects.values(*ORDER_ROW_FIELDS))
+
+    for name, fn in [('anidado', nested), ('prefetch', prefetched), ('filas', rows)]:
+        reset_queries()
+        with CaptureQueriesContext(connection) as ctx:
+            fn()
+        print(f"  {name:9} {summary(timed(fn, args.repeat))}   consultas {len(ctx.captured_queries)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Latencia de búsqueda: icontains vs índice FTS5 sobre un catálogo grande.
+
+Uso: python benchmarks/search.py [--products 50000] [--repeat 20]
+"""
+import argparse
+import random
+
+from common import setup_django, summary, timed
+
+NAMES = ['Hamburguesa', 'Pizza', 'Empanada', 'Completo', 'Sándwich', 'Ensalada', 'Limonada', 'Café']
+STYLES = ['Clásica', 'Italiana', 'Picante', 'Vegetariana', 'Doble', 'Especial', 'Pequeña', 'Jumbo']
+WORDS = ['queso', 'tomate', 'palta', 'cebolla', 'pollo', 'champiñón', 'jalapeño', 'albahaca',
+         'tocino', 'piña', 'aceituna', 'orégano', 'salsa', 'barbacoa', 'ají', 'limón']
+TERMS = ['hamburguesa clasica', 'champinon', 'pizza italiana', 'jalap', 'vegetariana palta', 'xyz']
+
+
+def populate(count):
+    from products.models import Category, Product, ProductTag
+
+    rng = random.Random(42)
+    categories = Category.objects.bulk_create(
+        [Category(name=f'Categoría {i}', icon='🍔') for i in range(20)]
+    )
+    batch = []
+    for i in range(count):
+        batch.append(Product(
+            name=f'{rng.choice(NAMES)} {rng.choice(STYLES)} {i}',
+            description=' '.join(rng.choices(WORDS, k=4)),
+            price=10,
+            category=rng.choice(categories),
+        ))
+        if len(batch) == 5000:
+            Product.objects.bulk_create(batch)
+            batch = []
+    Product.objects.bulk_create(batch)
+    ProductTag.objects.bulk_create(
+        [ProductTag(product_id=pid, name=rng.choice(STYLES)) for pid in Product.objects.values_list('id', flat=True)],
+        batch_size=5000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db.models import Q
+    from products.models import Product
+    from api.search import search_products
+
+    populate(args.products)
+    print(f"Catálogo: {Product.objects.count()} productos\n")
+
+    for term in TERMS:
+        def legacy():
+            # Búsqueda anterior de ProductViewSet.search: sin acentos, sin ranking y sin límite
+            list(Product.objects.filter(
+                Q(name__icontains=term) | Q(description__icontains=term) | Q(category__name__icontains=term),
+                is_active=True,
+            ).values_list('id', flat=True))
+
+        def fts():
+            return list(search_products(Product.objects.filter(is_active=True), term).values_list('id', flat=True))
+
+        legacy_count = Product.objects.filter(Q(name__icontains=term) | Q(description__icontains=term)).count()
+        print(f"'{term}'")
+        print(f"  icontains: {summary(timed(legacy, args.repeat))}   coincidencias {legacy_count}")
+        print(f"  fts5:      {summary(timed(fts, args.repeat))}   coincidencias {len(fts())}")
+
+
+if __name__ == '__main__':
+    main()
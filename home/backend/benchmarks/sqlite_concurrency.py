@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Lecturas y escrituras concurrentes sobre SQLite: perfil por defecto vs producción.
+
+Cada perfil usa su propia base temporal. Los lectores listan el catálogo y los
+últimos pedidos; los escritores crean pedidos con CreateOrderSerializer. Cada
+proceso es un worker independiente, como varios workers de gunicorn.
+
+Uso: python benchmarks/sqlite_concurrency.py [--readers 4] [--writers 2] [--seconds 10]
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from decimal import Decimal
+
+from common import setup_django, summary
+
+
+def prepare(profile, path):
+    os.environ['DATABASE_PROFILE'] = profile
+    setup_django(path=path)
+    from django.core.management import call_command
+    from products.models import Category, Ingredient, Product, ProductIngredient, ProductTag
+
+    call_command('migrate', verbosity=0)
+    categories = Category.objects.bulk_create([Category(name=f'Categoría {i}', icon='🍔') for i in range(10)])
+    ingredients = Ingredient.objects.bulk_create([Ingredient(name=f'Ingrediente {i}') for i in range(10)])
+    products = Product.objects.bulk_create([
+        Product(name=f'Producto {i}', description='Demo', price=Decimal('9.90'), category=categories[i % 10])
+        for i in range(200)
+    ])
+    ProductTag.objects.bulk_create([ProductTag(product=product, name='Popular') for product in products])
+    ProductIngredient.objects.bulk_create([
+        ProductIngredient(product=product, ingredient=ingredients[(product.id + i) % 10], extra_cost=Decimal('1.00'))
+        for product in products for i in range(3)
+    ])
+
+
+def worker(profile, path, role, seconds, results):
+    os.environ['DATABASE_PROFILE'] = profile
+    os.environ['API_LOG_LEVEL'] = 'WARNING'
+    setup_django(path=path)
+    from django.db import OperationalError, close_old_connections
+    from api.models import Order
+    from api.serializers import CreateOrderSerializer
+    from products.models import Product
+
+    product_ids = list(Product.objects.values_list('id', flat=True))
+
+    def read():
+        list(Product.objects.filter(is_active=True).select_related('category')
+             .prefetch_related('tags', 'product_ingredients'))
+        list(Order.objects.order_by('-created_at').values('order_number', 'status', 'total_amount')[:20])
+
+    def write(n):
+        serializer = CreateOrderSerializer(data={
+            'customer_name': 'Cliente', 'customer_email': 'c@example.com', 'customer_phone': '+56900000000',
+            'delivery_street': 'Calle', 'delivery_number': '1', 'delivery_city': 'Santiago', 'delivery_region': 'RM',
+            'items': [
+                {'product_id': str(product_ids[(n + i) % len(product_ids)]), 'quantity': '1', 'extras': {}}
+                for i in range(3)
+            ],
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+    latencies, errors, n = [], 0, 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            read() if role == 'reader' else write(n)
+        except OperationalError:
+            # "database is locked": la solicitud habría fallado con un 500
+            errors += 1
+            close_old_connections()
+        else:
+            latencies.append((time.perf_counter() - start) * 1000)
+        n += 1
+    results.put((role, latencies, errors))
+
+
+def run(profile, args):
+    context = multiprocessing.get_context('spawn')
+    path = os.path.join(tempfile.mkdtemp(prefix=f'fastfood-{profile}-'), 'bench.sqlite3')
+    setup = context.Process(target=prepare, args=(profile, path))
+    setup.start()
+    setup.join()
+
+    results = context.Queue()
+    roles = ['reader'] * args.readers + ['writer'] * args.writers
+    processes = [context.Process(target=worker, args=(profile, path, role, args.seconds, results)) for role in roles]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    print(f"perfil {profile}")
+    for role, label in (('reader', 'lecturas'), ('writer', 'escrituras')):
+        latencies = [value for r, samples, _ in collected if r == role for value in samples]
+        errors = sum(e for r, _, e in collected if r == role)
+        rate = len(latencies) / args.seconds
+        timing = summary(latencies) if latencies else 'sin operaciones completadas'
+        print(f"  {label:10} {rate:8.1f}/s   {timing}   errores {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profile', choices=['default', 'production'], nargs='+', default=['default', 'production'])
+    args = parser.parse_args()
+    print(f"{args.readers} lectores, {args.writers} escritores, {args.seconds:g} s por perfil\n")
+    for profile in args.profile:
+        run(profile, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestIdMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # Añadir esto antes de CommonMiddleware
@@ -88,6 +89,98 @@ DATABASES = {
     }
 }
 
+# Perfil de producción (opt-in con DATABASE_PROFILE=production):
+# - WAL: las lecturas del catálogo no esperan a las escrituras de pedidos
+# - timeout: espera hasta 20 s por el lock de escritura en vez de fallar al instante
+# - IMMEDIATE: cada transacción toma el lock de escritura al empezar, así dos
+#   transacciones no quedan bloqueadas entre sí al pasar de leer a escribir
+# - synchronous=NORMAL (seguro en WAL), 64 MB de caché de páginas y 256 MB de mmap
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'default')
+
+if DATABASE_PROFILE == 'production':
+    DATABASES['default'].update({
+        'ENGINE': 'fastfood.sqlite',
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA cache_size=-65536; '
+                'PRAGMA mmap_size=268435456; PRAGMA temp_store=MEMORY'
+            ),
+        },
+    })
+
+# Cache
+# Solo guarda las estadísticas de pedidos; las versiones del menú y de los
+# precios viven en la base de datos (api.versions) y las comparten los workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Pedidos
+# Segundos que se guarda la respuesta de un POST /api/orders/ con Idempotency-Key,
+# y cuánto espera un duplicado concurrente a que termine la solicitud original.
+# Una reserva sin respuesta se libera tras ORDER_IDEMPOTENCY_LEASE (mayor que el
+# timeout del worker, p. ej. 30 s en gunicorn)
+
+ORDER_IDEMPOTENCY_TTL = 24 * 60 * 60
+ORDER_IDEMPOTENCY_WAIT = 10
+ORDER_IDEMPOTENCY_LEASE = 60
+
+# 'sync' crea el pedido en la misma solicitud; 'queue' responde 202 y deja la
+# creación a `python manage.py process_order_queue`
+ORDER_INTAKE_MODE = os.environ.get('ORDER_INTAKE_MODE', 'sync')
+
+# /api/orders/changes/: la marca devuelta queda este margen por detrás del reloj
+# para no saltarse pedidos de transacciones que confirman tarde
+ORDER_CHANGES_SETTLE_SECONDS = 2
+
+# Segundos que se cachean las estadísticas de /api/orders/stats/
+ORDER_STATS_TTL = 30
+
+# Stream de pedidos en vivo (/api/orders/stream/, servir con fastfood.asgi).
+# LocalBroker reparte los eventos dentro de un proceso; con varios workers se
+# reemplaza por un broker compartido que numere cada evento con un contador común
+# y llame a api.events.hub.dispatch(id, tipo, datos) en cada worker
+ORDER_EVENTS_BROKER = os.environ.get('ORDER_EVENTS_BROKER', 'api.events.LocalBroker')
+ORDER_STREAM_HEARTBEAT = 15
+
+# Logging
+# Eventos JSON de la app `api` con id de correlación por solicitud. La escritura
+# ocurre en un hilo aparte; los eventos DEBUG se muestrean.
+
+API_LOG_LEVEL = os.environ.get('API_LOG_LEVEL', 'INFO')
+API_LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('API_LOG_DEBUG_SAMPLE_RATE', '0.01'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'api.log.RequestIdFilter'},
+        'debug_sampling': {'()': 'api.log.DebugSamplingFilter', 'rate': API_LOG_DEBUG_SAMPLE_RATE},
+    },
+    'formatters': {
+        'json': {'()': 'api.log.JsonFormatter'},
+    },
+    'handlers': {
+        'api': {
+            'class': 'api.log.NonBlockingHandler',
+            'formatter': 'json',
+            'filters': ['request_id', 'debug_sampling'],
+        },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['api'],
+            'level': API_LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
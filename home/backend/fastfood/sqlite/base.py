@@ -0,0 +1,38 @@
+"""Backend SQLite con las opciones ``init_command`` y ``transaction_mode``.
+
+Django 5.0 no las soporta (llegan en 5.1 con los mismos nombres): al actualizar
+basta volver a ``django.db.backends.sqlite3`` sin tocar ``OPTIONS``.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'EXCLUSIVE', 'IMMEDIATE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('init_command', None)
+        mode = params.pop('transaction_mode', None)
+        if mode is not None and mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"transaction_mode inválido: {mode!r}; use {', '.join(TRANSACTION_MODES)}"
+            )
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        # PRAGMAs separados por ';', uno por execute (sqlite3 ejecuta una sentencia a la vez)
+        init_command = self.settings_dict['OPTIONS'].get('init_command') or ''
+        for statement in init_command.split(';'):
+            if statement.strip():
+                conn.execute(statement)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        if mode is None:
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute(f'BEGIN {mode.upper()}')
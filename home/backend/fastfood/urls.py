@@ -22,9 +22,10 @@ from rest_framework.routers import DefaultRouter
 from api.views import (
     CategoryViewSet, ProductViewSet, ProductTagViewSet,
     HeroSectionViewSet, AboutSectionViewSet, ContactInfoViewSet, FeaturedProductViewSet,
-    IngredientViewSet, ProductIngredientViewSet, OrderViewSet
+    IngredientViewSet, ProductIngredientViewSet, OrderViewSet, menu_view, cart_quote_view
 )
 from api.auth import login_view, logout_view
+from api.streams import order_stream_view
 
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet)
@@ -40,7 +41,10 @@ router.register(r'orders', OrderViewSet)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/orders/stream/', order_stream_view, name='order-stream'),
     path('api/', include(router.urls)),
+    path('api/menu/', menu_view, name='menu'),
+    path('api/cart/quote/', cart_quote_view, name='cart-quote'),
     path('api/auth/login/', login_view, name='login'),
     path('api/auth/logout/', logout_view, name='logout'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -3,7 +3,7 @@ from .models import Category, Product, ProductTag, Ingredient, ProductIngredient
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'icon']
+    list_display = ['name', 'icon', 'active_products_count']
     search_fields = ['name']
     list_filter = ['name']
 
@@ -0,0 +1,57 @@
+# Generated by Django 5.0.2 on 2026-10-17 19:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def add_counter_column(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    if schema_editor.connection.vendor == 'sqlite':
+        # ADD COLUMN directo: Django recrearía la tabla y el renombrado falla por
+        # los triggers de búsqueda (api 0008) que leen products_category
+        schema_editor.execute(
+            'ALTER TABLE "products_category" ADD COLUMN "active_products_count" integer unsigned '
+            'NOT NULL DEFAULT 0 CHECK ("active_products_count" >= 0)'
+        )
+    else:
+        schema_editor.add_field(Category, Category._meta.get_field('active_products_count'))
+
+
+def remove_counter_column(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('ALTER TABLE "products_category" DROP COLUMN "active_products_count"')
+    else:
+        schema_editor.remove_field(Category, Category._meta.get_field('active_products_count'))
+
+
+def count_active_products(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+    active = (
+        Product.objects.filter(category=OuterRef('pk'), is_active=True)
+        .order_by().values('category').annotate(total=Count('id')).values('total')
+    )
+    Category.objects.update(active_products_count=Coalesce(Subquery(active), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_ingredient_alter_product_image_productingredient'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='category',
+                    name='active_products_count',
+                    field=models.PositiveIntegerField(default=0, editable=False),
+                ),
+            ],
+        ),
+        migrations.RunPython(add_counter_column, remove_counter_column),
+        migrations.RunPython(count_active_products, migrations.RunPython.noop),
+    ]
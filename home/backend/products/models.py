@@ -1,12 +1,28 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     icon = models.CharField(max_length=10, blank=True)
+    # Productos activos; lo mantiene Product al guardarse/eliminarse
+    # (reconcile_category_counts corrige desvíos de update()/bulk_create())
+    active_products_count = models.PositiveIntegerField(default=0, editable=False)
     
     def __str__(self):
         return self.name
 
+def adjust_active_count(category_id, delta):
+    """Sumar ``delta`` al contador con un UPDATE atómico (F), sin bajar de 0"""
+    if category_id is not None:
+        # Un contador desviado hacia abajo no debe impedir borrar o desactivar productos
+        Category.objects.filter(pk=category_id).update(
+            active_products_count=Greatest(F('active_products_count') + delta, 0)
+        )
+
+_UNKNOWN = object()
+
 class Product(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
@@ -17,9 +33,69 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Categoría en la que el producto está contado según la base de datos
+        if 'category_id' in field_names and 'is_active' in field_names:
+            instance._counted_category = instance.counted_category()
+        else:
+            instance._counted_category = _UNKNOWN
+        return instance
+    
+    def counted_category(self):
+        return self.category_id if self.is_active else None
+    
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None:
+            self._counted_category = self.counted_category()
+        else:
+            self._counted_category = _UNKNOWN
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'category', 'category_id', 'is_active'} & set(update_fields):
+            # No toca la categoría ni is_active: el contador no cambia
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            row = None
+            if self.pk is not None:
+                # La fila guardada se lee dentro de la transacción (con lock donde se
+                # soporta; en SQLite lo da transaction_mode IMMEDIATE): la instancia
+                # puede estar desactualizada u otro admin pudo cambiarla
+                row = (
+                    Product.objects.select_for_update().filter(pk=self.pk)
+                    .values('category_id', 'is_active').first()
+                )
+            previous = row['category_id'] if row and row['is_active'] else None
+            super().save(*args, **kwargs)
+            if update_fields is None or row is None:
+                current = self.counted_category()
+            else:
+                # Los campos que no se guardan conservan el valor de la fila
+                saved = set(update_fields)
+                category_id = self.category_id if saved & {'category', 'category_id'} else row['category_id']
+                is_active = self.is_active if 'is_active' in saved else row['is_active']
+                current = category_id if is_active else None
+            if previous != current:
+                adjust_active_count(previous, -1)
+                adjust_active_count(current, 1)
+        self._counted_category = current
+    
     def __str__(self):
         return self.name
 
+def product_deleted(sender, instance, **kwargs):
+    # También cubre QuerySet.delete() y el borrado en cascada de la categoría
+    counted = getattr(instance, '_counted_category', None)
+    if counted is _UNKNOWN:
+        counted = instance.counted_category()
+    adjust_active_count(counted, -1)
+
+post_delete.connect(product_deleted, sender=Product, dispatch_uid='product_active_count')
+
 class ProductTag(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='tags')
     name = models.CharField(max_length=50)